@@ -1,13 +1,56 @@
+import boto3
+import boto3.s3.transfer
 import botocore
+import botocore.config
+import concurrent.futures
+import datetime
+import functools
+import hashlib
 import inspect
+import io
+import json
 import os
 import random
 import re
+import tarfile
+import tempfile
+import threading
 import time
+import urllib.parse
+import zlib
+import zstandard
 
 import common
 
 
+# Findings and scans are exported in Parquet under Hive-style partitions, queryable with Athena
+S3_ANALYTICS_DIRECTORY = "secrets-finder/scheduled-scans/analytics"
+PARQUET_DICTIONARY_COLUMNS = [
+    "scan_identifier",
+    "repository",
+    "scan_context",
+    "scan_mode",
+    "scan_type",
+    "status",
+    "decoder_name",
+    "detector_name",
+    "source_name",
+    "filename",
+    "committer_email",
+]
+# Content-Encoding values supported for compressed artifacts, with the extension appended to their key
+S3_COMPRESSION_EXTENSIONS = {"gzip": ".gz", "zstd": ".zst"}
+S3_MANIFEST_FILENAME = ".s3-manifest.json"
+S3_MAX_CONCURRENT_TRANSFERS = 16
+S3_PYTHON_CACHE_DIRECTORY = "secrets-finder/scheduled-scans/cache/python"
+S3_TRANSFER_CONFIGURATION = boto3.s3.transfer.TransferConfig(
+    multipart_threshold=16 * 1024 * 1024,
+    multipart_chunksize=16 * 1024 * 1024,
+    max_concurrency=4,
+    use_threads=True,
+)
+
+
 def call_aws_service(fn, max_retries=5):
     delay = 1
     for i in range(max_retries):
@@ -30,6 +73,171 @@ def call_aws_service(fn, max_retries=5):
     raise Exception(f"Maximum attempts reached calling AWS service: {aws_service}")
 
 
+@functools.lru_cache(maxsize=None)
+def get_s3_client():
+    # A single client is shared by all transfers: its connection pool must be large enough
+    # to serve every concurrent transfer and each of their multipart threads.
+    return boto3.client(
+        "s3",
+        config=botocore.config.Config(
+            max_pool_connections=S3_MAX_CONCURRENT_TRANSFERS
+            * S3_TRANSFER_CONFIGURATION.max_concurrency
+        ),
+    )
+
+
+class GzipCompressingReader(io.RawIOBase):
+    """Readable stream returning the content of a file object compressed with gzip, chunk by chunk."""
+
+    def __init__(self, source, chunk_size=1024 * 1024):
+        self.source = source
+        self.chunk_size = chunk_size
+        self.compressor = zlib.compressobj(wbits=31)
+        self.buffer = b""
+        self.eof = False
+
+    def readable(self):
+        return True
+
+    def read(self, size=-1):
+        while not self.eof and (size is None or size < 0 or len(self.buffer) < size):
+            chunk = self.source.read(self.chunk_size)
+            if chunk:
+                self.buffer += self.compressor.compress(chunk)
+            else:
+                self.buffer += self.compressor.flush()
+                self.eof = True
+
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, b""
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def get_compressing_reader(source, compression):
+    if compression == "gzip":
+        return GzipCompressingReader(source)
+    elif compression == "zstd":
+        return zstandard.ZstdCompressor().stream_reader(source)
+    raise ValueError(
+        f"Unsupported compression: {compression} (should be one of: {list(S3_COMPRESSION_EXTENSIONS)})"
+    )
+
+
+class TransferError(Exception):
+    """Exception raised when at least one of the transfers handled by a TransferManager failed."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(
+            f"{len(errors)} S3 transfer(s) failed: "
+            + "; ".join(f"{path}: {error}" for path, error in errors)
+        )
+
+
+class TransferManager:
+    """
+    Runs S3 downloads and uploads concurrently using a bounded pool of workers and a shared client.
+
+    Transfers are submitted with download() and upload(), and are awaited when the manager is used
+    as a context manager (or when wait() is called). Errors are aggregated and raised as a single
+    TransferError once all the transfers are done, and the throughput observed is logged.
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        s3_bucket_name,
+        max_concurrent_transfers=S3_MAX_CONCURRENT_TRANSFERS,
+        transfer_configuration=S3_TRANSFER_CONFIGURATION,
+    ):
+        self.s3_client = s3_client
+        self.s3_bucket_name = s3_bucket_name
+        self.transfer_configuration = transfer_configuration
+        self.executor = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_concurrent_transfers
+        )
+        self.futures = {}
+        self.lock = threading.Lock()
+        self.transferred_files = 0
+        self.transferred_bytes = 0
+        self.start = time.monotonic()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.wait()
+        else:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+        return False
+
+    def download(self, s3_file_path, local_file_path, accept_missing=False):
+        future = self.executor.submit(
+            self._download, s3_file_path, local_file_path, accept_missing
+        )
+        self.futures[future] = s3_file_path
+        return future
+
+    def upload(self, local_file_path, s3_file_path, compression=None):
+        future = self.executor.submit(
+            self._upload, local_file_path, s3_file_path, compression
+        )
+        self.futures[future] = local_file_path
+        return future
+
+    def _download(self, s3_file_path, local_file_path, accept_missing):
+        downloaded = download_s3_file(
+            s3_client=self.s3_client,
+            s3_bucket_name=self.s3_bucket_name,
+            s3_file_path=s3_file_path,
+            local_file_path=local_file_path,
+            accept_missing=accept_missing,
+            transfer_configuration=self.transfer_configuration,
+        )
+        if downloaded:
+            self._record(os.path.getsize(local_file_path))
+        return downloaded
+
+    def _upload(self, local_file_path, s3_file_path, compression):
+        uploaded = upload_file_to_s3(
+            self.s3_client,
+            self.s3_bucket_name,
+            local_file_path,
+            s3_file_path,
+            transfer_configuration=self.transfer_configuration,
+            compression=compression,
+        )
+        self._record(os.path.getsize(local_file_path))
+        return uploaded
+
+    def _record(self, size):
+        with self.lock:
+            self.transferred_files += 1
+            self.transferred_bytes += size
+
+    def wait(self):
+        errors = []
+        for future in concurrent.futures.as_completed(list(self.futures)):
+            try:
+                future.result()
+            except Exception as e:
+                errors.append((self.futures[future], e))
+        self.executor.shutdown(wait=True)
+
+        elapsed = max(time.monotonic() - self.start, 0.001)
+        common.log(
+            "INFO",
+            "BACKEND",
+            f"{self.transferred_files} file(s) transferred ({self.transferred_bytes / 1024 / 1024:.1f} MiB) in {elapsed:.1f}s ({self.transferred_bytes / 1024 / 1024 / elapsed:.1f} MiB/s)",
+        )
+
+        if errors:
+            raise TransferError(errors)
+
+
 def get_imdsv2_token():
     token_url = "http://169.254.169.254/latest/api/token"
     token_headers = {"X-aws-ec2-metadata-token-ttl-seconds": "300"}
@@ -37,6 +245,17 @@ def get_imdsv2_token():
     return token_response.text
 
 
+def get_instance_metadata(path):
+    token = get_imdsv2_token()
+    headers = {"X-aws-ec2-metadata-token": token}
+    response = common.make_api_request(
+        method="GET",
+        url=f"http://169.254.169.254/latest/meta-data/{path}",
+        headers=headers,
+    )
+    return response.text
+
+
 def terminate_instance(ec2_client):
     token = get_imdsv2_token()
     headers = {"X-aws-ec2-metadata-token": token}
@@ -50,15 +269,37 @@ def terminate_instance(ec2_client):
     ec2_client.terminate_instances(InstanceIds=[instance_id])
 
 
-def upload_files_to_s3(s3_client, s3_bucket_name, s3_directory, local_directory):
-    if os.path.exists(local_directory):
-        for file in os.listdir(local_directory):
-            if file.endswith(".log") and os.path.isfile(
-                os.path.join(local_directory, file)
-            ):
-                upload_file_to_s3_using_local_directory_structure(
-                    s3_client, s3_bucket_name, s3_directory, local_directory, file
-                )
+def upload_files_to_s3(
+    s3_client,
+    s3_bucket_name,
+    s3_directory,
+    local_directory,
+    transfer_manager=None,
+    compression=None,
+):
+    if not os.path.exists(local_directory):
+        return
+
+    if transfer_manager is None:
+        with TransferManager(s3_client, s3_bucket_name) as transfer_manager:
+            return upload_files_to_s3(
+                s3_client,
+                s3_bucket_name,
+                s3_directory,
+                local_directory,
+                transfer_manager,
+                compression,
+            )
+
+    for file in os.listdir(local_directory):
+        if file.endswith(".log") and os.path.isfile(
+            os.path.join(local_directory, file)
+        ):
+            transfer_manager.upload(
+                os.path.join(local_directory, file),
+                os.path.join(s3_directory, file),
+                compression=compression,
+            )
 
 
 def upload_file_to_s3_using_local_directory_structure(
@@ -69,22 +310,55 @@ def upload_file_to_s3_using_local_directory_structure(
     upload_file_to_s3(s3_client, s3_bucket_name, local_file_path, s3_file_path)
 
 
-def upload_file_to_s3(s3_client, s3_bucket_name, local_file_path, s3_file_path):
+def upload_file_to_s3(
+    s3_client,
+    s3_bucket_name,
+    local_file_path,
+    s3_file_path,
+    transfer_configuration=None,
+    compression=None,
+):
     if not os.path.isfile(local_file_path):
         raise FileNotFoundError(
             f"File could not be uploaded to S3 as it does not exist: {local_file_path}"
         )
-    s3_client.upload_file(local_file_path, s3_bucket_name, s3_file_path)
+
+    if not compression:
+        s3_client.upload_file(
+            local_file_path,
+            s3_bucket_name,
+            s3_file_path,
+            Config=transfer_configuration,
+        )
+        return True
+
+    # The file is compressed while being read by the upload, so no compressed copy is written to disk
+    with open(local_file_path, "rb") as file:
+        s3_client.upload_fileobj(
+            get_compressing_reader(file, compression),
+            s3_bucket_name,
+            f"{s3_file_path}{S3_COMPRESSION_EXTENSIONS[compression]}",
+            ExtraArgs={"ContentEncoding": compression},
+            Config=transfer_configuration,
+        )
     return True
 
 
 def download_s3_file(
-    s3_client, s3_bucket_name, s3_file_path, local_file_path, accept_missing=False
+    s3_client,
+    s3_bucket_name,
+    s3_file_path,
+    local_file_path,
+    accept_missing=False,
+    transfer_configuration=None,
 ):
     try:
         call_aws_service(
             lambda: s3_client.download_file(
-                s3_bucket_name, s3_file_path, local_file_path
+                s3_bucket_name,
+                s3_file_path,
+                local_file_path,
+                Config=transfer_configuration,
             )
         )
         return True
@@ -100,26 +374,313 @@ def download_s3_file(
             raise
 
 
-def download_s3_bucket_directory(s3_client, s3_bucket_name, s3_path, local_path):
-    paginator = s3_client.get_paginator("list_objects")
-    for result in paginator.paginate(
-        Bucket=s3_bucket_name, Delimiter="/", Prefix=s3_path
-    ):
-        if result.get("CommonPrefixes") is not None:
-            for subdirectory in result.get("CommonPrefixes"):
-                download_s3_bucket_directory(
-                    s3_client, s3_bucket_name, subdirectory.get("Prefix"), local_path
-                )
+def download_s3_bucket_directory(
+    s3_client,
+    s3_bucket_name,
+    s3_path,
+    local_path,
+    transfer_manager=None,
+    manifest=False,
+):
+    if transfer_manager is None:
+        with TransferManager(s3_client, s3_bucket_name) as transfer_manager:
+            return download_s3_bucket_directory(
+                s3_client,
+                s3_bucket_name,
+                s3_path,
+                local_path,
+                transfer_manager,
+                manifest,
+            )
+
+    if not s3_path.endswith("/"):
+        s3_path += "/"
+
+    manifest_path = os.path.join(local_path, S3_MANIFEST_FILENAME)
+    previous_manifest = load_manifest(manifest_path) if manifest else {}
+    current_manifest = {}
+    downloads = {}
+
+    # A flat listing of the whole prefix costs one LIST call per page of 1000 objects,
+    # regardless of how deep the directory structure is.
+    paginator = s3_client.get_paginator("list_objects_v2")
+    for result in paginator.paginate(Bucket=s3_bucket_name, Prefix=s3_path):
         for file in result.get("Contents", []):
-            destination = os.path.join(local_path, file.get("Key")[len(s3_path) :])
-            if not os.path.exists(os.path.dirname(destination)):
-                os.makedirs(os.path.dirname(destination))
-            download_s3_file(
-                s3_client=s3_client,
-                s3_bucket_name=s3_bucket_name,
-                s3_file_path=file.get("Key"),
-                local_file_path=destination,
+            key = file.get("Key")
+            if key.endswith("/"):
+                continue
+
+            destination = os.path.join(local_path, key[len(s3_path) :])
+            entry = {"etag": file.get("ETag"), "size": file.get("Size")}
+            if (
+                manifest
+                and previous_manifest.get(key) == entry
+                and os.path.isfile(destination)
+                and os.path.getsize(destination) == entry["size"]
+            ):
+                current_manifest[key] = entry
+                continue
+
+            os.makedirs(os.path.dirname(destination), exist_ok=True)
+            downloads[transfer_manager.download(key, destination)] = (key, entry)
+
+    if manifest:
+        common.log(
+            "DEBUG",
+            "BACKEND",
+            f"Objects unchanged and skipped for prefix {s3_path}: {len(current_manifest)}",
+        )
+        concurrent.futures.wait(downloads)
+        for future, (key, entry) in downloads.items():
+            if not future.exception() and future.result():
+                current_manifest[key] = entry
+        save_manifest(manifest_path, current_manifest)
+
+
+def load_manifest(manifest_path):
+    try:
+        with open(manifest_path, "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_manifest(manifest_path, manifest):
+    os.makedirs(os.path.dirname(manifest_path), exist_ok=True)
+    with open(manifest_path, "w") as file:
+        json.dump(manifest, file, separators=(",", ":"))
+
+
+def restore_python_cache(s3_client, s3_bucket_name, requirements_files, cache_folder):
+    wheels_folder = os.path.join(cache_folder, "wheels")
+    os.makedirs(wheels_folder, exist_ok=True)
+
+    restored = 0
+    for key in {common.get_requirements_hash(file) for file in requirements_files}:
+        if os.path.isdir(os.path.join(wheels_folder, key)):
+            continue
+
+        with tempfile.TemporaryDirectory(dir=cache_folder) as temporary_directory:
+            archive = os.path.join(temporary_directory, f"{key}.tar.gz")
+            if not download_s3_file(
+                s3_client,
+                s3_bucket_name,
+                f"{S3_PYTHON_CACHE_DIRECTORY}/{key}.tar.gz",
+                archive,
+                accept_missing=True,
+            ):
+                continue
+
+            # Wheels are extracted next to the cache before being moved in place, so that a
+            # partially extracted archive is never used
+            destination = os.path.join(temporary_directory, key)
+            os.makedirs(destination)
+            with tarfile.open(archive, "r:gz") as tar:
+                for member in tar.getmembers():
+                    if member.isfile() and os.path.basename(member.name).endswith(
+                        ".whl"
+                    ):
+                        with open(
+                            os.path.join(destination, os.path.basename(member.name)),
+                            "wb",
+                        ) as file:
+                            file.write(tar.extractfile(member).read())
+            os.rename(destination, os.path.join(wheels_folder, key))
+            restored += 1
+
+    common.log("INFO", "BACKEND", f"Python wheels restored from cache: {restored}")
+    return restored
+
+
+def save_python_cache(s3_client, s3_bucket_name, cache_folder):
+    wheels_folder = os.path.join(cache_folder, "wheels")
+    if not os.path.isdir(wheels_folder):
+        return 0
+
+    saved = 0
+    for key in os.listdir(wheels_folder):
+        folder = os.path.join(wheels_folder, key)
+        s3_file_path = f"{S3_PYTHON_CACHE_DIRECTORY}/{key}.tar.gz"
+        if not os.path.isdir(folder):
+            continue
+
+        try:
+            s3_client.head_object(Bucket=s3_bucket_name, Key=s3_file_path)
+            continue
+        except botocore.exceptions.ClientError as e:
+            if e.response["Error"]["Code"] != "404":
+                raise
+
+        with tempfile.TemporaryDirectory(dir=cache_folder) as temporary_directory:
+            archive = os.path.join(temporary_directory, f"{key}.tar.gz")
+            with tarfile.open(archive, "w:gz") as tar:
+                for wheel in sorted(os.listdir(folder)):
+                    tar.add(os.path.join(folder, wheel), arcname=wheel)
+            upload_file_to_s3(s3_client, s3_bucket_name, archive, s3_file_path)
+        saved += 1
+
+    common.log("INFO", "BACKEND", f"Python wheels saved to cache: {saved}")
+    return saved
+
+
+def get_parquet_partition(date, scm, organization):
+    return "/".join(
+        f"{name}={urllib.parse.quote(value, safe='') if value else '__HIVE_DEFAULT_PARTITION__'}"
+        for name, value in [
+            ("date", date),
+            ("scm", scm),
+            ("organization", organization),
+        ]
+    )
+
+
+def export_results_to_parquet(results_file, destination_folder):
+    """
+    Exports the results of a scan as Parquet files, one per partition and table.
+
+    Files are written to <table>/date=<date>/scm=<scm>/organization=<organization>/<scan uuid>.parquet
+    in the destination folder, and their relative paths are returned. Partition keys are not
+    repeated in the files, as Athena does not allow it. The values of secrets are
+    not exported: findings hold their redacted value and a SHA-256 hash of the secret instead.
+    """
+    import pyarrow
+    import pyarrow.parquet
+
+    context_fields = [
+        (name, pyarrow.string())
+        for name in [
+            "job_uuid",
+            "scan_identifier",
+            "scan_context",
+            "scan_mode",
+            "scan_type",
+            "scan_uuid",
+            "repository",
+        ]
+    ]
+    schemas = {
+        "scans": pyarrow.schema(
+            context_fields
+            + [
+                ("started_on", pyarrow.timestamp("us")),
+                ("completed_on", pyarrow.timestamp("us")),
+                ("status", pyarrow.string()),
+                ("findings", pyarrow.int64()),
+                ("metadata", pyarrow.string()),
+            ]
+        ),
+        "findings": pyarrow.schema(
+            context_fields
+            + [
+                ("decoder_name", pyarrow.string()),
+                ("detector_name", pyarrow.string()),
+                ("detector_type", pyarrow.int64()),
+                ("secret_hash", pyarrow.string()),
+                ("redacted", pyarrow.string()),
+                ("verified", pyarrow.bool_()),
+                ("source_name", pyarrow.string()),
+                ("source_type", pyarrow.int64()),
+                ("filename", pyarrow.string()),
+                ("line_number", pyarrow.int64()),
+                ("commit_hash", pyarrow.string()),
+                ("committer_email", pyarrow.string()),
+                ("commit_timestamp", pyarrow.timestamp("us", tz="UTC")),
+                ("extra_data", pyarrow.string()),
+            ]
+        ),
+    }
+
+    with open(results_file, "r") as file:
+        data = json.load(file)
+
+    date = datetime.datetime.fromisoformat(data["start"]).date().isoformat()
+    job = {
+        "job_uuid": data["scan_uuid"],
+        "scan_identifier": data["scan_identifier"],
+        "scan_context": data["scan_context"],
+        "scan_mode": data["scan_mode"],
+        "scan_type": data["scan_type"],
+    }
+
+    tables = {"scans": {}, "findings": {}}
+    for result in data.get("results", []):
+        partition = get_parquet_partition(date, data["scm"], result.get("organization"))
+        context = {
+            **job,
+            "scan_uuid": result["scan_uuid"],
+            "repository": result.get("repository"),
+        }
+        tables["scans"].setdefault(partition, []).append(
+            {
+                **context,
+                "started_on": datetime.datetime.fromisoformat(result["start"]),
+                "completed_on": datetime.datetime.fromisoformat(result["end"]),
+                "status": result.get("status"),
+                "findings": len(result.get("findings", [])),
+                "metadata": (
+                    json.dumps(result["metadata"]) if "metadata" in result else None
+                ),
+            }
+        )
+
+        for finding in result.get("findings", []):
+            source = next(
+                iter(finding.get("SourceMetadata", {}).get("Data", {}).values()), {}
             )
+            secret = f"{finding.get('Raw', '')}\0{finding.get('RawV2', '')}"
+            tables["findings"].setdefault(partition, []).append(
+                {
+                    **context,
+                    "decoder_name": finding.get("DecoderName"),
+                    "detector_name": finding.get("DetectorName"),
+                    "detector_type": finding.get("DetectorType"),
+                    "secret_hash": hashlib.sha256(secret.encode()).hexdigest(),
+                    "redacted": finding.get("Redacted"),
+                    "verified": finding.get("Verified"),
+                    "source_name": finding.get("SourceName"),
+                    "source_type": finding.get("SourceType"),
+                    "filename": source.get("file"),
+                    "line_number": source.get("line"),
+                    "commit_hash": source.get("commit"),
+                    "committer_email": source.get("email"),
+                    "commit_timestamp": (
+                        datetime.datetime.strptime(
+                            source["timestamp"], "%Y-%m-%d %H:%M:%S %z"
+                        )
+                        if source.get("timestamp")
+                        else None
+                    ),
+                    "extra_data": (
+                        json.dumps(finding["ExtraData"])
+                        if finding.get("ExtraData")
+                        else None
+                    ),
+                }
+            )
+
+    exported_files = []
+    for table, partitions in tables.items():
+        for partition, rows in partitions.items():
+            relative_path = f"{table}/{partition}/{data['scan_uuid']}.parquet"
+            file_path = os.path.join(destination_folder, relative_path)
+            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            arrow_table = pyarrow.Table.from_pylist(rows, schema=schemas[table])
+            pyarrow.parquet.write_table(
+                arrow_table,
+                file_path,
+                compression="zstd",
+                use_dictionary=[
+                    column
+                    for column in PARQUET_DICTIONARY_COLUMNS
+                    if column in arrow_table.column_names
+                ],
+            )
+            exported_files.append(relative_path)
+
+    common.log(
+        "INFO", "BACKEND", f"Results exported to Parquet: {len(exported_files)} file(s)"
+    )
+    return exported_files
 
 
 def get_secret_value_from_secrets_manager(secrets_manager_client, reference):
@@ -57,6 +57,20 @@ def configure_parser():
         type=common.non_empty_string,
         default=os.environ.get("SECRETS_FINDER_SNS_TOPIC_ARN"),
     )
+    parser.add_argument(
+        "--compression",
+        help="the compression to apply to results and logs uploaded to the S3 bucket",
+        choices=["none", *backend.S3_COMPRESSION_EXTENSIONS],
+        default=os.environ.get("SECRETS_FINDER_ARTIFACTS_COMPRESSION", "none"),
+    )
+    parser.add_argument(
+        "--export-parquet",
+        help="whether to also export findings and scans as partitioned Parquet files for analytics",
+        action="store_true",
+        default=common.str_to_bool(
+            os.environ.get("SECRETS_FINDER_EXPORT_PARQUET", "false")
+        ),
+    )
     parser.add_argument(
         "--terminate-instance-after-scan",
         help="whether to terminate the instance at the end of operations",
@@ -102,42 +116,67 @@ def main():
         sys.exit(2)
 
     try:
-        s3 = boto3.client("s3")
-
-        common.log(
-            "INFO",
-            "FINALIZER",
-            f"Uploading results to S3 bucket: {arguments.s3_bucket_name}",
-        )
-        backend.upload_file_to_s3_using_local_directory_structure(
-            s3,
-            arguments.s3_bucket_name,
-            f"secrets-finder/scheduled-scans/results",
-            arguments.scanner_folder,
-            f"{arguments.scan_uuid}.json",
-        )
-        common.log(
-            "INFO",
-            "FINALIZER",
-            f"Uploading logs from scan folder to S3 bucket: {arguments.s3_bucket_name}",
-        )
-        backend.upload_files_to_s3(
-            s3,
-            arguments.s3_bucket_name,
-            f"secrets-finder/scheduled-scans/logs/{arguments.scan_uuid}",
-            os.path.join(arguments.scan_folder, "logs"),
-        )
-        common.log(
-            "INFO",
-            "FINALIZER",
-            f"Uploading logs from scanner folder to S3 bucket: {arguments.s3_bucket_name}",
-        )
-        backend.upload_files_to_s3(
-            s3,
-            arguments.s3_bucket_name,
-            f"secrets-finder/scheduled-scans/logs/{arguments.scan_uuid}",
-            os.path.join(arguments.scanner_folder, "logs"),
+        s3 = backend.get_s3_client()
+        compression = arguments.compression if arguments.compression != "none" else None
+        results_file = os.path.join(
+            arguments.scanner_folder, f"{arguments.scan_uuid}.json"
         )
+        analytics_folder = os.path.join(arguments.scanner_folder, "analytics")
+
+        with backend.TransferManager(s3, arguments.s3_bucket_name) as transfer_manager:
+            common.log(
+                "INFO",
+                "FINALIZER",
+                f"Uploading results to S3 bucket: {arguments.s3_bucket_name}",
+            )
+            transfer_manager.upload(
+                results_file,
+                f"secrets-finder/scheduled-scans/results/{arguments.scan_uuid}.json",
+                compression=compression,
+            )
+
+            for folder in [arguments.scan_folder, arguments.scanner_folder]:
+                common.log(
+                    "INFO",
+                    "FINALIZER",
+                    f"Uploading logs from folder {folder} to S3 bucket: {arguments.s3_bucket_name}",
+                )
+                backend.upload_files_to_s3(
+                    s3,
+                    arguments.s3_bucket_name,
+                    f"secrets-finder/scheduled-scans/logs/{arguments.scan_uuid}",
+                    os.path.join(folder, "logs"),
+                    transfer_manager=transfer_manager,
+                    compression=compression,
+                )
+
+        # The analytics export is optional, so it never prevents the scan from being finalized
+        if arguments.export_parquet:
+            try:
+                with backend.TransferManager(
+                    s3, arguments.s3_bucket_name
+                ) as transfer_manager:
+                    # Parquet files are compressed internally, so they are uploaded as they are
+                    for relative_path in backend.export_results_to_parquet(
+                        results_file, analytics_folder
+                    ):
+                        transfer_manager.upload(
+                            os.path.join(analytics_folder, relative_path),
+                            f"{backend.S3_ANALYTICS_DIRECTORY}/{relative_path}",
+                        )
+            except Exception as e:
+                common.log(
+                    "WARNING", "FINALIZER", f"Unable to export results to Parquet: {e}"
+                )
+
+        try:
+            backend.save_python_cache(
+                s3,
+                arguments.s3_bucket_name,
+                os.path.join(arguments.scanner_folder, common.PYTHON_CACHE_FOLDER),
+            )
+        except Exception as e:
+            common.log("WARNING", "FINALIZER", f"Unable to save Python cache: {e}")
 
         if arguments.terminate_instance_after_scan:
             common.log("INFO", "FINALIZER", "Terminating instance...")
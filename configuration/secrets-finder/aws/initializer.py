@@ -1,11 +1,17 @@
 import argparse
 import boto3
+import glob
+import hashlib
 import json
 import logging
 import os
+import platform
+import shutil
 import yaml
 import sys
+import tarfile
 import tempfile
+import time
 
 import common
 import backend
@@ -76,6 +82,19 @@ def configure_parser():
         type=common.non_empty_string,
         default=os.environ.get("SECRETS_FINDER_TRUFFLEHOG_VERSION"),
     )
+    parser.add_argument(
+        "--trufflehog-archive-sha256",
+        help="the SHA-256 checksum of the TruffleHog release archive, checked before installing TruffleHog from the cache (by default, the checksum published with the release is used)",
+        type=common.non_empty_string,
+        default=os.environ.get("SECRETS_FINDER_TRUFFLEHOG_ARCHIVE_SHA256"),
+    )
+    parser.add_argument(
+        "--seed-trufflehog-cache",
+        help="whether to store TruffleHog in the S3 bucket when it is not cached yet",
+        action="store_true",
+        default=os.environ.get("SECRETS_FINDER_SEED_TRUFFLEHOG_CACHE", "false").lower()
+        == "true",
+    )
     parser.add_argument(
         "--user",
         help="the user running the scan on the instance",
@@ -119,6 +138,9 @@ def configure_parser():
     return parser.parse_args()
 
 
+DATADOG_AGENT_LOGS_PORT = 10518
+
+
 def configure_datadog(datadog_api_key_reference):
     if datadog_api_key_reference:
         try:
@@ -164,6 +186,18 @@ def configure_datadog(datadog_api_key_reference):
                 "logs": [{"type": "journald", "include_units": ["scanner.service"]}]
             }
 
+            # Records shipped by the scanner when its log sink is the local agent
+            scanner_log_configuration = {
+                "logs": [
+                    {
+                        "type": "tcp",
+                        "port": DATADOG_AGENT_LOGS_PORT,
+                        "service": "secrets-finder",
+                        "source": "secrets-finder",
+                    }
+                ]
+            }
+
             common.log(
                 "DEBUG",
                 "INITIALIZER",
@@ -192,6 +226,17 @@ def configure_datadog(datadog_api_key_reference):
             ) as file:
                 yaml.dump(log_configuration, file)
 
+            common.create_directory(
+                os.path.join("etc", "datadog-agent", "conf.d", "secrets-finder.d")
+            )
+            with open(
+                os.path.join(
+                    "etc", "datadog-agent", "conf.d", "secrets-finder.d", "conf.yaml"
+                ),
+                "w",
+            ) as file:
+                yaml.dump(scanner_log_configuration, file)
+
             common.log(
                 "DEBUG", "INITIALIZER", "Setting permissions for dd-agent user..."
             )
@@ -228,7 +273,7 @@ def get_datadog_api_token(reference):
 
 def download_scan_files(s3_bucket_name, scan_identifier, secrets_finder_scan_folder):
     common.log("INFO", "INITIALIZER", "Downloading scan files...")
-    s3 = boto3.client("s3")
+    s3 = backend.get_s3_client()
     backend.download_s3_bucket_directory(
         s3,
         s3_bucket_name,
@@ -237,52 +282,66 @@ def download_scan_files(s3_bucket_name, scan_identifier, secrets_finder_scan_fol
     )
 
 
+def restore_python_cache(s3_bucket_name, secrets_finder_scan_folder, cache_folder):
+    common.log("INFO", "INITIALIZER", "Restoring Python cache for user scripts...")
+    requirements_files = glob.glob(
+        os.path.join(secrets_finder_scan_folder, "*.requirements.txt")
+    )
+    if not requirements_files:
+        return
+
+    # The cache only speeds up user scripts, so the scan goes on without it
+    try:
+        backend.restore_python_cache(
+            backend.get_s3_client(), s3_bucket_name, requirements_files, cache_folder
+        )
+    except Exception as e:
+        common.log("WARNING", "INITIALIZER", f"Unable to restore Python cache: {e}")
+
+
 def download_scanner_files(
-    s3_bucket_name, scan_identifier, secrets_finder_scanner_folder
+    s3_bucket_name,
+    scan_identifier,
+    secrets_finder_scanner_folder,
+    trufflehog_version=None,
 ):
     common.log("INFO", "INITIALIZER", "Downloading scanner files...")
 
-    s3 = boto3.client("s3")
-    backend.download_s3_bucket_directory(
-        s3,
-        s3_bucket_name,
-        f"secrets-finder/scheduled-scans/scans/{scan_identifier}/setup",
-        secrets_finder_scanner_folder,
-    )
-    backend.download_s3_file(
-        s3_client=s3,
-        s3_bucket_name=s3_bucket_name,
-        s3_file_path=f"secrets-finder/scheduled-scans/scanner/git-credentials-helper.sh",
-        local_file_path=os.path.join(
-            secrets_finder_scanner_folder, "git-credentials-helper.sh"
-        ),
-        accept_missing=False,
-    )
-    backend.download_s3_file(
-        s3_client=s3,
-        s3_bucket_name=s3_bucket_name,
-        s3_file_path=f"secrets-finder/scheduled-scans/scanner/scan-configuration.schema.json",
-        local_file_path=os.path.join(
-            secrets_finder_scanner_folder, "scan-configuration.schema.json"
-        ),
-        accept_missing=False,
-    )
-    backend.download_s3_file(
-        s3_client=s3,
-        s3_bucket_name=s3_bucket_name,
-        s3_file_path=f"secrets-finder/scheduled-scans/scanner/scanner.py",
-        local_file_path=os.path.join(secrets_finder_scanner_folder, "scanner.py"),
-        accept_missing=False,
-    )
-    backend.download_s3_file(
-        s3_client=s3,
-        s3_bucket_name=s3_bucket_name,
-        s3_file_path=f"secrets-finder/scheduled-scans/scanner/configuration.yaml",
-        local_file_path=os.path.join(
-            secrets_finder_scanner_folder, "configuration.yaml"
-        ),
-        accept_missing=True,
-    )
+    s3 = backend.get_s3_client()
+    with backend.TransferManager(s3, s3_bucket_name) as transfer_manager:
+        backend.download_s3_bucket_directory(
+            s3,
+            s3_bucket_name,
+            f"secrets-finder/scheduled-scans/scans/{scan_identifier}/setup",
+            secrets_finder_scanner_folder,
+            transfer_manager=transfer_manager,
+        )
+        for file, accept_missing in [
+            ("git-credentials-helper.sh", False),
+            ("scan-configuration.schema.json", False),
+            ("scanner.py", False),
+            ("configuration.yaml", True),
+        ]:
+            transfer_manager.download(
+                s3_file_path=f"secrets-finder/scheduled-scans/scanner/{file}",
+                local_file_path=os.path.join(secrets_finder_scanner_folder, file),
+                accept_missing=accept_missing,
+            )
+
+        # The cached TruffleHog archive is optional: TruffleHog is installed from upstream on a miss
+        if trufflehog_version:
+            archive = get_trufflehog_archive_name(trufflehog_version)
+            os.makedirs(
+                os.path.join(secrets_finder_scanner_folder, TRUFFLEHOG_CACHE_FOLDER),
+                exist_ok=True,
+            )
+            transfer_manager.download(
+                s3_file_path=f"{TRUFFLEHOG_CACHE_S3_DIRECTORY}/{archive}",
+                local_file_path=os.path.join(
+                    secrets_finder_scanner_folder, TRUFFLEHOG_CACHE_FOLDER, archive
+                ),
+                accept_missing=True,
+            )
 
 
 def set_system_locale(locale):
@@ -344,7 +403,149 @@ def enable_service(service):
     common.run_command(command)
 
 
-def install_trufflehog(trufflehog_installation_path, trufflehog_version):
+TRUFFLEHOG_CACHE_S3_DIRECTORY = "secrets-finder/scheduled-scans/scanner/trufflehog"
+TRUFFLEHOG_RELEASES_URL = (
+    "https://github.com/trufflesecurity/trufflehog/releases/download"
+)
+TRUFFLEHOG_CACHE_FOLDER = "trufflehog"
+TRUFFLEHOG_ARCHITECTURES = {"x86_64": "amd64", "aarch64": "arm64", "arm64": "arm64"}
+
+
+def get_trufflehog_archive_name(trufflehog_version):
+    machine = platform.machine().lower()
+    architecture = TRUFFLEHOG_ARCHITECTURES.get(machine, machine)
+    return f"trufflehog_{trufflehog_version}_linux_{architecture}.tar.gz"
+
+
+def compute_sha256(file):
+    digest = hashlib.sha256()
+    with open(file, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def get_trufflehog_archive_checksum(trufflehog_version, pinned_checksum=None):
+    """
+    Returns the SHA-256 checksum expected for the TruffleHog release archive: the pinned checksum
+    when provided, otherwise the checksum published upstream with the release. The cache never
+    provides its own reference checksum, so a substituted archive is rejected.
+    """
+    if pinned_checksum:
+        return pinned_checksum.strip().lower()
+
+    archive_name = get_trufflehog_archive_name(trufflehog_version)
+    response = common.make_api_request(
+        method="GET",
+        url=f"{TRUFFLEHOG_RELEASES_URL}/v{trufflehog_version}/trufflehog_{trufflehog_version}_checksums.txt",
+        timeout=30,
+    )
+    for line in response.text.splitlines():
+        fields = line.split()
+        if len(fields) == 2 and fields[1] == archive_name:
+            return fields[0].lower()
+    raise Exception(f"No checksum published for TruffleHog archive: {archive_name}")
+
+
+def install_trufflehog_from_archive(
+    archive, trufflehog_installation_path, expected_checksum
+):
+    if not os.path.isfile(archive):
+        common.log(
+            "INFO", "INITIALIZER", f"TruffleHog archive not found in cache: {archive}"
+        )
+        return False
+
+    if compute_sha256(archive) != expected_checksum:
+        common.log(
+            "WARNING",
+            "INITIALIZER",
+            f"Checksum mismatch for cached TruffleHog archive, ignoring it: {archive}",
+        )
+        return False
+
+    # Only the binary is extracted, under a fixed name, so archive paths are never trusted
+    try:
+        with tarfile.open(archive, "r:gz") as tar:
+            member = tar.getmember("trufflehog")
+            if not member.isfile():
+                raise tarfile.TarError("'trufflehog' is not a regular file")
+            source = tar.extractfile(member)
+            with open(
+                os.path.join(trufflehog_installation_path, "trufflehog"), "wb"
+            ) as destination:
+                shutil.copyfileobj(source, destination)
+    except (tarfile.TarError, KeyError, EOFError, OSError) as e:
+        common.log(
+            "WARNING",
+            "INITIALIZER",
+            f"Unable to extract TruffleHog from cached archive, ignoring it: {archive} ({e})",
+        )
+        return False
+
+    common.log(
+        "INFO", "INITIALIZER", f"TruffleHog installed from cached archive: {archive}"
+    )
+    return True
+
+
+def install_trufflehog_from_upstream(
+    trufflehog_installation_path, trufflehog_version, working_directory=None
+):
+    # The installation may run while /tmp is being remounted, so temporary files are kept in a
+    # dedicated directory (also used as TMPDIR by the installation script).
+    with tempfile.TemporaryDirectory(dir=working_directory) as temporary_directory:
+        installation_script = os.path.join(temporary_directory, "install.sh")
+        download_command = f"curl -sSfL https://raw.githubusercontent.com/trufflesecurity/trufflehog/main/scripts/install.sh -o {installation_script}"
+        common.attempt_operation_with_retry(
+            lambda: common.run_command(download_command)
+        )
+
+        install_command = (
+            f"sh {installation_script} -b '{trufflehog_installation_path}'"
+        )
+        if trufflehog_version:
+            install_command += f" 'v{trufflehog_version}'"
+        common.run_command(install_command, env={"TMPDIR": temporary_directory})
+
+
+def seed_trufflehog_cache(
+    s3_bucket_name,
+    trufflehog_version,
+    expected_checksum,
+    working_directory=None,
+):
+    # The release archive itself is cached, so that it can be checked against the same checksum
+    archive_name = get_trufflehog_archive_name(trufflehog_version)
+    common.log("INFO", "INITIALIZER", f"Seeding TruffleHog cache: {archive_name}")
+    with tempfile.TemporaryDirectory(dir=working_directory) as temporary_directory:
+        local_archive = os.path.join(temporary_directory, archive_name)
+        download_command = f"curl -sSfL {TRUFFLEHOG_RELEASES_URL}/v{trufflehog_version}/{archive_name} -o {local_archive}"
+        common.attempt_operation_with_retry(
+            lambda: common.run_command(download_command)
+        )
+        if compute_sha256(local_archive) != expected_checksum:
+            raise Exception(
+                f"Checksum mismatch for TruffleHog release archive: {archive_name}"
+            )
+
+        s3 = backend.get_s3_client()
+        backend.upload_file_to_s3(
+            s3,
+            s3_bucket_name,
+            local_archive,
+            f"{TRUFFLEHOG_CACHE_S3_DIRECTORY}/{archive_name}",
+        )
+
+
+def install_trufflehog(
+    trufflehog_installation_path,
+    trufflehog_version,
+    working_directory=None,
+    s3_bucket_name=None,
+    seed_cache=False,
+    archive_checksum=None,
+):
     common.log("INFO", "INITIALIZER", "Installing TruffleHog...")
     common.log(
         "DEBUG",
@@ -356,49 +557,166 @@ def install_trufflehog(trufflehog_installation_path, trufflehog_version):
     if not os.path.isdir(trufflehog_installation_path):
         os.makedirs(trufflehog_installation_path)
 
-    with tempfile.NamedTemporaryFile(delete=True) as temporary_file:
-        download_command = f"curl -sSfL https://raw.githubusercontent.com/trufflesecurity/trufflehog/main/scripts/install.sh -o {temporary_file.name}"
-        common.attempt_operation_with_retry(
-            lambda: common.run_command(download_command)
-        )
+    # Only pinned versions are cached, as the latest version changes over time
+    archive = None
+    expected_checksum = None
+    if trufflehog_version and working_directory:
+        try:
+            expected_checksum = get_trufflehog_archive_checksum(
+                trufflehog_version, archive_checksum
+            )
+            archive = os.path.join(
+                working_directory,
+                TRUFFLEHOG_CACHE_FOLDER,
+                get_trufflehog_archive_name(trufflehog_version),
+            )
+        except Exception as e:
+            common.log(
+                "WARNING",
+                "INITIALIZER",
+                f"Unable to get the checksum of the TruffleHog archive, ignoring the cache: {e}",
+            )
 
-        install_command = (
-            f"sh {temporary_file.name} -b '{trufflehog_installation_path}'"
+    installed_from_cache = archive is not None and install_trufflehog_from_archive(
+        archive, trufflehog_installation_path, expected_checksum
+    )
+    if not installed_from_cache:
+        install_trufflehog_from_upstream(
+            trufflehog_installation_path,
+            trufflehog_version,
+            working_directory=working_directory,
         )
-        if trufflehog_version:
-            install_command += f" 'v{trufflehog_version}'"
-        common.run_command(install_command)
 
     make_script_executable(os.path.join(trufflehog_installation_path, "trufflehog"))
 
+    if not installed_from_cache and archive and seed_cache and s3_bucket_name:
+        try:
+            seed_trufflehog_cache(
+                s3_bucket_name,
+                trufflehog_version,
+                expected_checksum,
+                working_directory=working_directory,
+            )
+        except Exception as e:
+            common.log(
+                "WARNING", "INITIALIZER", f"Unable to seed TruffleHog cache: {e}"
+            )
+
+    if working_directory:
+        shutil.rmtree(
+            os.path.join(working_directory, TRUFFLEHOG_CACHE_FOLDER),
+            ignore_errors=True,
+        )
+
     common.log("INFO", "INITIALIZER", "TruffleHog has been installed successfully.")
 
 
+INSTANCE_STORE_DEVICE_PATTERN = (
+    "/dev/disk/by-id/nvme-Amazon_EC2_NVMe_Instance_Storage_*"
+)
+INSTANCE_STORE_MOUNT_POINT = "/tmp"
+SWAP_FILE = os.path.join(INSTANCE_STORE_MOUNT_POINT, "swapfile")
+SWAP_MEMORY_RATIO = 2
+SWAP_MAX_INSTANCE_STORE_RATIO = 0.25
+
+
+def get_instance_store_devices():
+    devices = []
+    for link in sorted(glob.glob(INSTANCE_STORE_DEVICE_PATTERN)):
+        if "-part" in os.path.basename(link):
+            continue
+        device = os.path.realpath(link)
+        if device not in devices:
+            devices.append(device)
+    return devices
+
+
+def get_memory_size():
+    with open("/proc/meminfo", "r") as file:
+        for line in file:
+            if line.startswith("MemTotal:"):
+                return int(line.split()[1]) * 1024
+    raise Exception("Unable to determine the memory size of the instance")
+
+
+def get_available_space(folder):
+    statistics = os.statvfs(folder)
+    return statistics.f_bavail * statistics.f_frsize
+
+
+def get_swap_size(memory_size, available_space):
+    size = min(
+        memory_size * SWAP_MEMORY_RATIO,
+        int(available_space * SWAP_MAX_INSTANCE_STORE_RATIO),
+    )
+    return size - size % (1024 * 1024)
+
+
+def configure_swap(swap_file, size):
+    start = time.monotonic()
+    size_in_mebibytes = size // (1024 * 1024)
+    common.log(
+        "INFO",
+        "INITIALIZER",
+        f"Creating swap file of {size_in_mebibytes} MiB: {swap_file}",
+    )
+
+    try:
+        common.run_command(f"fallocate -l {size_in_mebibytes}M '{swap_file}'")
+    except Exception as e:
+        common.log(
+            "WARNING",
+            "INITIALIZER",
+            f"Unable to allocate swap file with fallocate, falling back to dd: {e}",
+        )
+        common.run_command(
+            f"dd if=/dev/zero of='{swap_file}' bs=1M count={size_in_mebibytes}"
+        )
+
+    common.run_command(f"chmod 0600 '{swap_file}'")
+    common.run_command(f"mkswap '{swap_file}'")
+    common.run_command(f"swapon '{swap_file}'")
+    with open("/etc/fstab", "a") as file:
+        file.write(f"{swap_file} swap swap defaults 0 0\n")
+
+    common.log(
+        "INFO",
+        "INITIALIZER",
+        f"Swap file enabled in {time.monotonic() - start:.2f}s: {swap_file}",
+    )
+
+
 def configure_instance():
     common.log("INFO", "INITIALIZER", "Configuring instance...")
 
-    token = backend.get_imdsv2_token()
-    headers = {"X-aws-ec2-metadata-token": token}
-    response = common.make_api_request(
-        method="GET",
-        url="http://169.254.169.254/latest/meta-data/instance-type",
-        headers=headers,
-    )
-    if response.text == "i4i.2xlarge":
-        common.run_command("mkfs.ext4 /dev/nvme1n1 -O ^has_journal")
+    instance_type = backend.get_instance_metadata("instance-type")
+    devices = get_instance_store_devices()
+    if not devices:
+        common.log(
+            "INFO",
+            "INITIALIZER",
+            f"No NVMe instance store found on instance type {instance_type}, skipping storage and swap configuration",
+        )
+    else:
+        device = devices[0]
+        common.log(
+            "INFO",
+            "INITIALIZER",
+            f"Using NVMe instance store of instance type {instance_type}: {device}",
+        )
+        common.run_command(f"mkfs.ext4 {device} -O ^has_journal")
         with open("/etc/fstab", "a") as file:
             file.write(
-                "/dev/nvme1n1 /tmp ext4 defaults,noatime,discard,barrier=0 1 2\n"
+                f"{device} {INSTANCE_STORE_MOUNT_POINT} ext4 defaults,noatime,discard,barrier=0 1 2\n"
             )
         common.run_command("mount -a")
-        common.run_command("chmod 777 /tmp")
-        common.run_command("dd if=/dev/zero of=/tmp/swapfile bs=128M count=1024")
-        common.run_command("chmod 0600 /tmp/swapfile")
-        common.run_command("mkswap /tmp/swapfile")
-        common.run_command("swapon /tmp/swapfile")
-        with open("/etc/fstab", "a") as file:
-            file.write("/tmp/swapfile swap swap defaults 0 0\n")
-        common.run_command("mount -a")
+        common.run_command(f"chmod 777 {INSTANCE_STORE_MOUNT_POINT}")
+
+        swap_size = get_swap_size(
+            get_memory_size(), get_available_space(INSTANCE_STORE_MOUNT_POINT)
+        )
+        if swap_size > 0:
+            configure_swap(SWAP_FILE, swap_size)
 
     common.run_command("echo 1", output_file="/sys/module/zswap/parameters/enabled")
 
@@ -416,14 +734,9 @@ def start_service(service):
 
 
 def upload_log_files_to_s3(s3_bucket_name, s3_directory, local_directory):
-    s3 = boto3.client("s3")
-    for file in os.listdir(local_directory):
-        if file.endswith(".log") and os.path.isfile(
-            os.path.join(local_directory, file)
-        ):
-            backend.upload_file_to_s3_using_local_directory_structure(
-                s3, s3_bucket_name, s3_directory, local_directory, file
-            )
+    backend.upload_files_to_s3(
+        backend.get_s3_client(), s3_bucket_name, s3_directory, local_directory
+    )
 
 
 def main():
@@ -451,61 +764,121 @@ def main():
         sys.exit(2)
 
     try:
-        configure_datadog(arguments.datadog_api_key_reference)
-
-        download_scan_files(
-            arguments.s3_bucket_name, arguments.scan_identifier, arguments.scan_folder
-        )
-        download_scanner_files(
-            arguments.s3_bucket_name,
-            arguments.scan_identifier,
-            arguments.scanner_folder,
-        )
-
-        set_system_locale("LANG=en_US.UTF-8")
-        install_packages("jq git glibc-langpack-en")
-
-        username, token = get_secrets_finder_credentials(
-            arguments.credentials_reference
-        )
-
-        environment_variables = os.environ.copy()
-        environment_variables["SECRETS_FINDER_SCAN_USERNAME"] = username
-        environment_variables["SECRETS_FINDER_SCAN_TOKEN"] = token
-
-        configure_git_credential_helper(
-            arguments.user,
-            os.path.join(arguments.scanner_folder, "git-credentials-helper.sh"),
-        )
-
-        make_script_executable(
-            os.path.join(arguments.scanner_folder, "git-credentials-helper.sh")
+        scanner_folder = arguments.scanner_folder
+        git_credentials_helper = os.path.join(
+            scanner_folder, "git-credentials-helper.sh"
         )
-
-        service_environment_variables = {
-            "SECRETS_FINDER_SCAN_USERNAME": username,
-            "SECRETS_FINDER_SCAN_TOKEN": token,
-        }
-
         service_environment_variables_file = os.path.join("etc", "secrets-finder.env")
-        write_environment_variables_to_file(
-            service_environment_variables, service_environment_variables_file
-        )
-        set_permissions(service_environment_variables_file, 0o400)
 
-        common.run_command(
-            f"mv {os.path.join(arguments.scanner_folder, 'scanner.service')} {os.path.join('usr', 'lib', 'systemd', 'system', 'secrets-finder.service')}"
-        )
-        enable_service("secrets-finder.service")
+        def prepare_git_credentials_helper(_):
+            configure_git_credential_helper(arguments.user, git_credentials_helper)
+            make_script_executable(git_credentials_helper)
 
-        install_trufflehog(
-            arguments.trufflehog_installation_path, arguments.trufflehog_version
-        )
-
-        configure_instance()
+        def configure_service_environment(results):
+            username, token = results["credentials"]
+            write_environment_variables_to_file(
+                {
+                    "SECRETS_FINDER_SCAN_USERNAME": username,
+                    "SECRETS_FINDER_SCAN_TOKEN": token,
+                },
+                service_environment_variables_file,
+            )
+            set_permissions(service_environment_variables_file, 0o400)
 
-        set_owner_permissions(arguments.user, arguments.scan_folder)
-        set_owner_permissions(arguments.user, arguments.scanner_folder)
+        def configure_service(_):
+            common.run_command(
+                f"mv {os.path.join(scanner_folder, 'scanner.service')} {os.path.join('usr', 'lib', 'systemd', 'system', 'secrets-finder.service')}"
+            )
+            enable_service("secrets-finder.service")
+
+        def configure_owner_permissions(_):
+            set_owner_permissions(arguments.user, arguments.scan_folder)
+            set_owner_permissions(arguments.user, scanner_folder)
+
+        # Operations are run concurrently as soon as the operations they depend on are completed.
+        # The instance is configured before any other operation, as /tmp is remounted on the NVMe
+        # instance store when available and files written there beforehand would be hidden.
+        common.run_operations_graph(
+            {
+                "datadog": (
+                    lambda _: configure_datadog(arguments.datadog_api_key_reference),
+                    ["instance"],
+                ),
+                "scan-files": (
+                    lambda _: download_scan_files(
+                        arguments.s3_bucket_name,
+                        arguments.scan_identifier,
+                        arguments.scan_folder,
+                    ),
+                    ["instance"],
+                ),
+                "scanner-files": (
+                    lambda _: download_scanner_files(
+                        arguments.s3_bucket_name,
+                        arguments.scan_identifier,
+                        scanner_folder,
+                        trufflehog_version=arguments.trufflehog_version,
+                    ),
+                    ["instance"],
+                ),
+                "python-cache": (
+                    lambda _: restore_python_cache(
+                        arguments.s3_bucket_name,
+                        arguments.scan_folder,
+                        os.path.join(scanner_folder, common.PYTHON_CACHE_FOLDER),
+                    ),
+                    ["scan-files"],
+                ),
+                "instance": (lambda _: configure_instance(), []),
+                "packages": (
+                    lambda _: install_packages("jq git glibc-langpack-en"),
+                    ["instance"],
+                ),
+                "locale": (
+                    lambda _: set_system_locale("LANG=en_US.UTF-8"),
+                    ["packages"],
+                ),
+                "credentials": (
+                    lambda _: get_secrets_finder_credentials(
+                        arguments.credentials_reference
+                    ),
+                    ["instance"],
+                ),
+                "git-credentials-helper": (
+                    prepare_git_credentials_helper,
+                    ["packages", "scanner-files"],
+                ),
+                "service-environment": (
+                    configure_service_environment,
+                    ["credentials"],
+                ),
+                "service": (configure_service, ["scanner-files"]),
+                "trufflehog": (
+                    lambda _: install_trufflehog(
+                        arguments.trufflehog_installation_path,
+                        arguments.trufflehog_version,
+                        working_directory=scanner_folder,
+                        s3_bucket_name=arguments.s3_bucket_name,
+                        seed_cache=arguments.seed_trufflehog_cache,
+                        archive_checksum=arguments.trufflehog_archive_sha256,
+                    ),
+                    ["scanner-files"],
+                ),
+                "owner-permissions": (
+                    configure_owner_permissions,
+                    [
+                        "scan-files",
+                        "scanner-files",
+                        "python-cache",
+                        "git-credentials-helper",
+                        "service",
+                        # The installation creates and deletes files in the scanner folder
+                        "trufflehog",
+                    ],
+                ),
+            },
+            context="INITIALIZER",
+        )
 
         start_service("secrets-finder.service")
     except Exception as e:
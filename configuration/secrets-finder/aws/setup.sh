@@ -57,6 +57,7 @@ write "INFO" "Download of requirements"
 aws s3 cp "s3://$S3_BUCKET/secrets-finder/scheduled-scans/scanner/common.requirements.txt" "$SECRETS_FINDER_SCANNER_FOLDER"
 aws s3 cp "s3://$S3_BUCKET/secrets-finder/scheduled-scans/scanner/backend.requirements.txt" "$SECRETS_FINDER_SCANNER_FOLDER"
 aws s3 cp "s3://$S3_BUCKET/secrets-finder/scheduled-scans/scanner/scanner.requirements.txt" "$SECRETS_FINDER_SCANNER_FOLDER"
+aws s3 cp "s3://$S3_BUCKET/secrets-finder/scheduled-scans/scanner/verification-cache.requirements.txt" "$SECRETS_FINDER_SCANNER_FOLDER"
 
 write "INFO" "Download of environment files"
 aws s3 cp "s3://$S3_BUCKET/secrets-finder/scheduled-scans/scans/${scan_identifier}/setup/backend.env" "$SECRETS_FINDER_SCANNER_FOLDER"
@@ -75,6 +76,12 @@ write "INFO" "Installation of scanner dependencies"
 python3 -m pip install --upgrade pip && pip install -r "$SECRETS_FINDER_SCANNER_FOLDER/common.requirements.txt" && pip install -r "$SECRETS_FINDER_SCANNER_FOLDER/backend.requirements.txt" && pip install -r "$SECRETS_FINDER_SCANNER_FOLDER/scanner.requirements.txt"
 check_exit_code
 
+if grep -q "^SECRETS_FINDER_VERIFICATION_CACHE_DATABASE_URL=." "$SECRETS_FINDER_SCANNER_FOLDER/scanner.env"; then
+    write "INFO" "Installation of verification cache dependencies"
+    pip install -r "$SECRETS_FINDER_SCANNER_FOLDER/verification-cache.requirements.txt"
+    check_exit_code
+fi
+
 write "INFO" "Initialization of scanner"
 python3 "$SECRETS_FINDER_SCANNER_FOLDER/initializer.py"
 check_exit_code
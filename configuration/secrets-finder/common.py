@@ -1,15 +1,30 @@
 import argparse
+import atexit
+import concurrent.futures
 import datetime
 import dotenv
 import glob
+import gzip
+import hashlib
 import json
 import logging
 import logging.config
+import logging.handlers
 import os
+import platform
+import queue
+import re
 import requests
 import shlex
+import shutil
+import socket
 import subprocess
+import sys
+import sysconfig
+import tempfile
+import threading
 import time
+import urllib.parse
 import uuid
 
 
@@ -40,35 +55,225 @@ def generate_unique_identifier():
     return str(uuid.uuid4())
 
 
-def configure_logging(destination_folder, log_file, level=logging.INFO):
+LOG_LEVELS = {
+    "DEBUG": logging.DEBUG,
+    "INFO": logging.INFO,
+    "WARNING": logging.WARNING,
+    "ERROR": logging.ERROR,
+}
+
+_log_encoder = json.JSONEncoder(separators=(",", ":"))
+_log_listener = None
+
+
+def configure_logging(
+    destination_folder, log_file, level=logging.INFO, asynchronous=False, sink=None
+):
+    """
+    Configures the root logger to write records to a file in the destination folder.
+
+    When asynchronous is set, records are put on a queue and written to the file by a background
+    thread, so that callers never wait for disk I/O. The queue is flushed when the process exits,
+    or when stop_logging is called.
+
+    When a sink is provided (tcp://<host>:<port> or s3://<bucket>/<prefix>), records are also
+    shipped to it in batches by a BatchingLogHandler.
+    """
+    global _log_listener
+
     create_directory(destination_folder)
     logging.config.dictConfig({"version": 1, "disable_existing_loggers": True})
-    logging.basicConfig(
-        format="%(message)s",
-        filename=os.path.join(destination_folder, log_file),
-        level=level,
-    )
+
+    formatter = logging.Formatter("%(message)s")
+    handlers = [logging.FileHandler(os.path.join(destination_folder, log_file))]
+    if sink:
+        handlers.append(BatchingLogHandler(get_log_sender(sink)))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    stop_logging()
+    if asynchronous:
+        records = queue.SimpleQueue()
+        _log_listener = logging.handlers.QueueListener(records, *handlers)
+        _log_listener.start()
+        atexit.register(stop_logging)
+        handlers = [logging.handlers.QueueHandler(records)]
+        handlers[0].setFormatter(formatter)
+
+    logging.basicConfig(handlers=handlers, level=level, force=True)
+
+
+class BatchingLogHandler(logging.Handler):
+    """
+    Ships formatted records to a sender in batches, from a background thread.
+
+    Records are put on a bounded queue so that callers never wait for the sender: when the queue
+    is full, records are dropped (they are still written to the log file) and the number of
+    records dropped is reported in the next batch. A batch is sent once it holds batch_size
+    records, or after flush_interval seconds.
+    """
+
+    def __init__(self, sender, max_queue_size=10000, batch_size=500, flush_interval=5):
+        super().__init__()
+        self.sender = sender
+        self.records = queue.Queue(maxsize=max_queue_size)
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+        self.dropped_lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = threading.Thread(target=self._ship, daemon=True)
+        self.thread.start()
+
+    def emit(self, record):
+        try:
+            self.records.put_nowait(self.format(record))
+        except queue.Full:
+            with self.dropped_lock:
+                self.dropped += 1
+
+    def _get_batch(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            try:
+                if self.stopping.is_set():
+                    batch.append(self.records.get_nowait())
+                else:
+                    timeout = max(0, deadline - time.monotonic())
+                    batch.append(self.records.get(timeout=timeout))
+            except queue.Empty:
+                break
+
+        with self.dropped_lock:
+            dropped, self.dropped = self.dropped, 0
+        if dropped:
+            batch.append(
+                _log_encoder.encode(
+                    {
+                        "time": str(datetime.datetime.now()),
+                        "level": "WARNING",
+                        "context": "LOGGING",
+                        "message": f"{dropped} log record(s) dropped as the shipping queue was full",
+                    }
+                )
+            )
+        return batch
+
+    def _ship(self):
+        while True:
+            stopping = self.stopping.is_set()
+            batch = self._get_batch()
+            if batch:
+                try:
+                    self.sender(batch)
+                except Exception as e:
+                    # Records cannot be logged from here without being shipped again
+                    print(
+                        f"Unable to ship {len(batch)} log record(s): {e}",
+                        file=sys.stderr,
+                    )
+            if stopping and self.records.empty():
+                return
+
+    def close(self):
+        self.stopping.set()
+        self.thread.join(timeout=self.flush_interval * 2)
+        close = getattr(self.sender, "close", None)
+        if close:
+            close()
+        super().close()
+
+
+class TcpLogSender:
+    """
+    Sends records as newline-delimited JSON over TCP, for example to a TCP log source of the
+    Datadog agent, which compresses and forwards them.
+    """
+
+    def __init__(self, host, port, timeout=5):
+        self.address = (host, port)
+        self.timeout = timeout
+        self.connection = None
+
+    def __call__(self, batch):
+        if self.connection is None:
+            self.connection = socket.create_connection(self.address, self.timeout)
+        try:
+            self.connection.sendall(("\n".join(batch) + "\n").encode())
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+
+
+class S3LogSender:
+    """
+    Stores each batch of records as a gzip-compressed newline-delimited JSON object under a prefix
+    of an S3 bucket, so that logs of a running scan can be followed before it is finalized.
+    """
+
+    def __init__(self, bucket, prefix):
+        # boto3 is only required when logs are shipped to S3
+        import boto3
+
+        self.s3 = boto3.client("s3")
+        self.bucket = bucket
+        self.prefix = prefix
+        self.sequence = 0
+
+    def __call__(self, batch):
+        self.sequence += 1
+        self.s3.put_object(
+            Bucket=self.bucket,
+            Key=f"{self.prefix}/{self.sequence:08d}.jsonl.gz",
+            Body=gzip.compress(("\n".join(batch) + "\n").encode()),
+            ContentType="application/x-ndjson",
+            ContentEncoding="gzip",
+        )
 
 
-def log(
-    level,
-    context,
-    message,
-    levels={
-        "INFO": logging.info,
-        "WARNING": logging.warning,
-        "ERROR": logging.error,
-        "DEBUG": logging.debug,
-    },
-):
-    current_time = str(datetime.datetime.now())
+def get_log_sender(url):
+    location = urllib.parse.urlparse(url)
+    if location.scheme == "tcp":
+        return TcpLogSender(location.hostname, location.port)
+    if location.scheme == "s3":
+        return S3LogSender(location.netloc, location.path.strip("/"))
+    raise ValueError(f"Unsupported log sink: {url}")
 
-    log_string = json.dumps(
-        {"time": current_time, "level": level, "context": context, "message": message},
-        separators=(",", ":"),
+
+def stop_logging():
+    global _log_listener
+
+    if _log_listener is not None:
+        _log_listener.stop()
+        _log_listener = None
+
+
+def is_log_enabled(level):
+    return logging.getLogger().isEnabledFor(LOG_LEVELS[level])
+
+
+def log(level, context, message):
+    # The level is checked first, so that records which are dropped are never formatted
+    numeric_level = LOG_LEVELS[level]
+    if not logging.getLogger().isEnabledFor(numeric_level):
+        return
+
+    log_string = _log_encoder.encode(
+        {
+            "time": str(datetime.datetime.now()),
+            "level": level,
+            "context": context,
+            "message": message,
+        }
     )
 
-    return levels[level]("%s", log_string)
+    return logging.log(numeric_level, "%s", log_string)
 
 
 def load_environment_variables(folder, environment_file):
@@ -88,6 +293,77 @@ def attempt_operation_with_retry(operation, max_retries=3, backoff_factor=1):
                 time.sleep(backoff_factor * (2**i))
 
 
+def run_operations_graph(operations, max_workers=8, context="MAIN"):
+    """
+    Runs operations concurrently while respecting their dependencies.
+
+    Operations are provided as a dictionary mapping the name of each operation to a tuple holding
+    the callable to execute and the list of names of the operations it depends on. Each callable
+    receives a dictionary holding the results of the operations completed so far, and is started
+    as soon as all its dependencies are completed. If an operation fails, no new operation is
+    started and the first error is raised once the operations already running are completed.
+    """
+    for name, (_, dependencies) in operations.items():
+        for dependency in dependencies:
+            if dependency not in operations:
+                raise ValueError(
+                    f"Unknown dependency for operation '{name}': {dependency}"
+                )
+
+    def run(name, operation, results):
+        start = time.monotonic()
+        log("DEBUG", context, f"Operation started: {name}")
+        result = operation(results)
+        log(
+            "INFO",
+            context,
+            f"Operation completed in {time.monotonic() - start:.2f}s: {name}",
+        )
+        return result
+
+    start = time.monotonic()
+    results = {}
+    errors = []
+    pending = dict(operations)
+    running = {}
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while pending or running:
+            if not errors:
+                for name, (operation, dependencies) in list(pending.items()):
+                    if all(dependency in results for dependency in dependencies):
+                        del pending[name]
+                        future = executor.submit(run, name, operation, dict(results))
+                        running[future] = name
+
+            if not running:
+                if errors:
+                    break
+                raise ValueError(
+                    f"Circular dependencies found between operations: {list(pending)}"
+                )
+
+            done, _ = concurrent.futures.wait(
+                running, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                name = running.pop(future)
+                try:
+                    results[name] = future.result()
+                except Exception as e:
+                    log("ERROR", context, f"Operation failed: {name}. Error: {e}")
+                    errors.append(e)
+
+    if errors:
+        raise errors[0]
+
+    log(
+        "INFO",
+        context,
+        f"{len(operations)} operation(s) completed in {time.monotonic() - start:.2f}s",
+    )
+    return results
+
+
 def shutdown():
     os.system("shutdown -h now")
 
@@ -175,11 +451,113 @@ def get_env_file(folder, filename):
     return env_file if os.path.isfile(env_file) else None
 
 
-def run_python_script(file, requirements_file, env_file, folder):
+PYTHON_CACHE_FOLDER = "python-cache"
+
+_virtual_environment_locks = {}
+_virtual_environment_locks_lock = threading.Lock()
+
+
+def get_requirements_hash(requirements_file):
+    """
+    Computes the key identifying a requirements file in the virtual environment cache.
+
+    Blank lines, comments and surrounding whitespace are ignored, so that files declaring the same
+    requirements share the same virtual environment and wheels. The Python version and platform
+    are part of the key, as wheels restored from a previous scan may have been built elsewhere.
+    """
+    with open(requirements_file, "r") as file:
+        # URL fragments such as '#egg=' are kept: comments start a line or follow whitespace
+        requirements = [re.sub(r"(^|\s)#.*", "", line).strip() for line in file]
+    content = "\n".join(
+        [
+            sys.implementation.cache_tag,
+            ".".join(str(part) for part in sys.version_info[:3]),
+            platform.machine(),
+            sysconfig.get_platform(),
+        ]
+        + [requirement for requirement in requirements if requirement]
+    )
+    return hashlib.sha256(content.encode()).hexdigest()
+
+
+def get_cached_virtual_environment(requirements_file, cache_folder):
+    """
+    Returns a virtual environment with the requirements installed, creating it when needed.
+
+    Virtual environments are stored in the cache folder under the hash of the requirements, and
+    are installed from wheels stored next to them: wheels are only built when missing, and can be
+    restored from a previous scan to avoid downloading and building them again.
+    """
+    key = get_requirements_hash(requirements_file)
+    virtual_environment = os.path.join(cache_folder, "venvs", key)
+    wheels = os.path.join(cache_folder, "wheels", key)
+    marker = os.path.join(virtual_environment, ".complete")
+
+    with _virtual_environment_locks_lock:
+        lock = _virtual_environment_locks.setdefault(key, threading.Lock())
+
+    with lock:
+        if os.path.isfile(marker):
+            log("DEBUG", "MAIN", f"Using cached virtual environment: {key}")
+            return virtual_environment
+
+        start = time.monotonic()
+        shutil.rmtree(virtual_environment, ignore_errors=True)
+        create_virtual_environment(os.path.dirname(virtual_environment), key)
+        pip_bin = os.path.join(virtual_environment, "bin", "pip")
+
+        if not os.path.isdir(wheels):
+            os.makedirs(os.path.dirname(wheels), exist_ok=True)
+            # Wheels are built in a temporary folder so an interrupted build is never reused
+            temporary_wheels = tempfile.mkdtemp(dir=os.path.dirname(wheels))
+            try:
+                attempt_operation_with_retry(
+                    lambda: run_command(
+                        f"{pip_bin} wheel -r '{requirements_file}' -w '{temporary_wheels}'"
+                    )
+                )
+                os.rename(temporary_wheels, wheels)
+            finally:
+                shutil.rmtree(temporary_wheels, ignore_errors=True)
+
+        try:
+            run_command(
+                f"{pip_bin} install --no-index --find-links '{wheels}' -r '{requirements_file}'"
+            )
+        except Exception as e:
+            log(
+                "WARNING",
+                "MAIN",
+                f"Unable to install requirements from cached wheels, installing them from the package index: {e}",
+            )
+            # Unusable wheels are discarded so that they are built again by the next scan
+            shutil.rmtree(wheels, ignore_errors=True)
+            attempt_operation_with_retry(
+                lambda: run_command(f"{pip_bin} install -r '{requirements_file}'")
+            )
+        open(marker, "w").close()
+
+        log(
+            "INFO",
+            "MAIN",
+            f"Virtual environment created in {time.monotonic() - start:.2f}s: {key}",
+        )
+        return virtual_environment
+
+
+def run_python_script(
+    file, requirements_file, env_file, folder, cache_folder=None, output_folder=None
+):
     python_command = f"python3 '{file}'"
     environment_variables_to_pass = os.environ.copy()
 
-    if requirements_file:
+    if requirements_file and cache_folder:
+        virtual_environment = get_cached_virtual_environment(
+            requirements_file, cache_folder
+        )
+        python_bin = os.path.join(virtual_environment, "bin/python")
+        python_command = f"{python_bin} '{file}'"
+    elif requirements_file:
         virtual_environment_folder_name = (
             f"{os.path.splitext(os.path.basename(file))[0]}-venv"
         )
@@ -195,21 +573,95 @@ def run_python_script(file, requirements_file, env_file, folder):
         script_environment_variables = dotenv.dotenv_values(env_file)
         environment_variables_to_pass.update(script_environment_variables)
 
+    output_file = error_file = None
+    if output_folder:
+        os.makedirs(output_folder, exist_ok=True)
+        filename_without_extension = os.path.splitext(os.path.basename(file))[0]
+        output_file = os.path.join(
+            output_folder, f"{filename_without_extension}.stdout.log"
+        )
+        error_file = os.path.join(
+            output_folder, f"{filename_without_extension}.stderr.log"
+        )
+
     run_command(
-        python_command, env=environment_variables_to_pass, working_directory=folder
+        python_command,
+        env=environment_variables_to_pass,
+        output_file=output_file,
+        error_file=error_file,
+        working_directory=folder,
     )
 
 
-def run_python_scripts(folder, pattern):
-    files = get_python_files(folder, pattern)
+def get_python_script_groups(files):
+    """
+    Splits scripts into groups of scripts that can be executed concurrently.
 
+    Consecutive scripts sharing the same numeric prefix after their lifecycle (for example
+    post_10_notify.py and post_10_export.py) belong to the same group. Scripts without such a
+    prefix are placed in a group of their own, so they keep running one after another.
+    """
+    groups = []
+    previous_prefix = None
     for file in files:
+        parts = os.path.splitext(os.path.basename(file))[0].split("_", 2)
+        prefix = parts[1] if len(parts) == 3 and parts[1].isdigit() else None
+        if prefix is not None and prefix == previous_prefix:
+            groups[-1].append(file)
+        else:
+            groups.append([file])
+        previous_prefix = prefix
+    return groups
+
+
+def run_python_scripts(
+    folder, pattern, cache_folder=None, max_workers=1, output_folder=None
+):
+    """
+    Runs the Python scripts of a folder matching a pattern, in sorted order.
+
+    When max_workers is greater than 1, the scripts of each group returned by
+    get_python_script_groups are executed concurrently, with at most max_workers scripts running
+    at the same time. Groups are executed one after another, and no new group is started once a
+    script failed. The output of each script is saved in the output folder when provided.
+    """
+
+    def run(file):
+        start = time.monotonic()
         filename_without_extension = os.path.splitext(os.path.basename(file))[0]
         requirements_file = get_requirements_file(
             folder, f"{filename_without_extension}.requirements.txt"
         )
         env_file = get_env_file(folder, f"{filename_without_extension}.env")
-        run_python_script(file, requirements_file, env_file, folder)
+        try:
+            run_python_script(
+                file, requirements_file, env_file, folder, cache_folder, output_folder
+            )
+        except Exception as e:
+            log(
+                "ERROR",
+                "MAIN",
+                f"Script failed after {time.monotonic() - start:.2f}s: {os.path.basename(file)}. Error: {e}",
+            )
+            raise
+        log(
+            "INFO",
+            "MAIN",
+            f"Script executed in {time.monotonic() - start:.2f}s: {os.path.basename(file)}",
+        )
+
+    files = get_python_files(folder, pattern)
+    if max_workers <= 1:
+        for file in files:
+            run(file)
+        return
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for group in get_python_script_groups(files):
+            futures = [executor.submit(run, file) for file in group]
+            concurrent.futures.wait(futures)
+            for future in futures:
+                future.result()
 
 
 def make_api_request(method, url, max_retries=3, backoff_factor=1, **kwargs):
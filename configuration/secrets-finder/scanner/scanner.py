@@ -1,11 +1,13 @@
 import argparse
 import concurrent.futures
 import datetime
+import hashlib
 import json
 import jsonschema
 import logging
 import logging.config
 import os
+import re
 import sys
 import tempfile
 import threading
@@ -82,6 +84,39 @@ def configure_parser():
             os.environ.get("SECRETS_FINDER_REPORT_ONLY_VERIFIED", "false")
         ),
     )
+    parser.add_argument(
+        "--verification-cache-ttl",
+        help="the number of seconds during which the verification result of a secret is reused instead of verifying the secret again (0 disables the cache)",
+        type=int,
+        default=int(os.environ.get("SECRETS_FINDER_VERIFICATION_CACHE_TTL", 0)),
+    )
+    parser.add_argument(
+        "--verification-cache-database-url",
+        help="the URL of the findings database in which verification results are also stored, to share them across scans",
+        type=common.non_empty_string,
+        default=os.environ.get("SECRETS_FINDER_VERIFICATION_CACHE_DATABASE_URL")
+        or None,
+    )
+    parser.add_argument(
+        "--deduplicate-fork-networks",
+        action="store_true",
+        help="scan the history shared by forks and copies of a repository only once, and attribute findings to every repository containing them",
+        default=common.str_to_bool(
+            os.environ.get("SECRETS_FINDER_DEDUPLICATE_FORK_NETWORKS", "false")
+        ),
+    )
+    parser.add_argument(
+        "--log-sink",
+        help="where to ship logs while the scan is running (tcp://<host>:<port> or s3://<bucket>/<prefix>)",
+        type=common.non_empty_string,
+        default=os.environ.get("SECRETS_FINDER_LOG_SINK") or None,
+    )
+    parser.add_argument(
+        "--user-scripts-concurrency",
+        help="the maximum number of pre- and post-scan scripts executed concurrently (scripts are grouped by numeric prefix, e.g. post_10_*.py)",
+        type=int,
+        default=int(os.environ.get("SECRETS_FINDER_USER_SCRIPTS_CONCURRENCY", 1)),
+    )
     parser.add_argument(
         "--exit-on-error-pre",
         action="store_true",
@@ -98,6 +133,279 @@ def configure_parser():
     return parser.parse_args()
 
 
+DIFF_SCAN_BRANCH = "secrets-finder-head"
+
+
+def is_null_commit(value):
+    return bool(value) and set(value) == {"0"}
+
+
+def is_diff_scan_base_commit(value):
+    return (
+        bool(value)
+        and not is_null_commit(value)
+        and re.fullmatch(r"[0-9a-f]{40}|[0-9a-f]{64}", value) is not None
+    )
+
+
+def is_fork_network_candidate(repository):
+    # Repositories scanned with options restricting their history are scanned on their own
+    return not any(
+        repository.get(option)
+        for option in ["head", "since-commit", "branch", "max-depth"]
+    )
+
+
+def group_fork_networks(root_commits):
+    """
+    Groups repositories sharing at least one root commit.
+
+    root_commits maps an index to the set of root commits of a repository; the result is a list
+    of lists of indexes, each list holding the repositories of a fork network.
+    """
+    parents = {index: index for index in root_commits}
+
+    def find(index):
+        while parents[index] != index:
+            parents[index] = parents[parents[index]]
+            index = parents[index]
+        return index
+
+    owners = {}
+    for index, commits in root_commits.items():
+        for commit in commits:
+            if commit in owners:
+                parents[find(index)] = find(owners[commit])
+            else:
+                owners[commit] = index
+
+    networks = {}
+    for index in root_commits:
+        networks.setdefault(find(index), []).append(index)
+    return list(networks.values())
+
+
+def intern_string(value):
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def serialize_finding(value):
+    if isinstance(value, Finding):
+        return value.to_dict()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class Finding:
+    """
+    Compact representation of a finding reported by TruffleHog.
+
+    Only the fields used by the ingestion and the results schema are kept, and strings repeated
+    across findings are interned. to_dict() returns the layout of TruffleHog's JSON output.
+    """
+
+    SOURCE_METADATA_FIELDS = (
+        "commit",
+        "file",
+        "email",
+        "repository",
+        "timestamp",
+        "line",
+    )
+
+    __slots__ = (
+        "source_id",
+        "source_type",
+        "source_name",
+        "source_metadata_type",
+        "source_metadata",
+        "detector_type",
+        "detector_name",
+        "decoder_name",
+        "verified",
+        "raw",
+        "raw_v2",
+        "redacted",
+        "extra_data",
+    )
+
+    def __init__(self, finding):
+        data = finding.get("SourceMetadata", {}).get("Data") or {}
+        source_metadata_type, metadata = next(iter(data.items()), (None, {}))
+
+        self.source_id = finding.get("SourceID")
+        self.source_type = finding.get("SourceType")
+        self.source_name = intern_string(finding.get("SourceName"))
+        self.source_metadata_type = intern_string(source_metadata_type)
+        # Metadata is kept as a tuple of values, ordered as SOURCE_METADATA_FIELDS
+        self.source_metadata = tuple(
+            intern_string(metadata.get(field))
+            for field in Finding.SOURCE_METADATA_FIELDS
+        )
+        self.detector_type = finding.get("DetectorType")
+        self.detector_name = intern_string(finding.get("DetectorName"))
+        self.decoder_name = intern_string(finding.get("DecoderName"))
+        self.verified = finding.get("Verified")
+        self.raw = finding.get("Raw")
+        self.raw_v2 = finding.get("RawV2")
+        self.redacted = finding.get("Redacted")
+        self.extra_data = finding.get("ExtraData")
+
+    def to_dict(self):
+        metadata = {
+            field: value
+            for field, value in zip(
+                Finding.SOURCE_METADATA_FIELDS, self.source_metadata
+            )
+            if value is not None
+        }
+        return {
+            "SourceMetadata": (
+                {"Data": {self.source_metadata_type: metadata}}
+                if self.source_metadata_type
+                else {}
+            ),
+            "SourceID": self.source_id,
+            "SourceType": self.source_type,
+            "SourceName": self.source_name,
+            "DetectorType": self.detector_type,
+            "DetectorName": self.detector_name,
+            "DecoderName": self.decoder_name,
+            "Verified": self.verified,
+            "Raw": self.raw,
+            "RawV2": self.raw_v2,
+            "Redacted": self.redacted,
+            "ExtraData": self.extra_data,
+        }
+
+
+class VerificationCache:
+    """
+    Verification results of secrets, keyed by detector and a SHA-256 hash of the secret.
+
+    Results are kept in a local file and, when a database URL is provided, in the
+    verification_cache table of the findings database. Secrets themselves are never stored.
+    """
+
+    def __init__(self, file_path, ttl, database_url=None):
+        self.file_path = file_path
+        self.ttl = ttl
+        self.database_url = database_url
+        self.entries = {}
+        self.updated_keys = set()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_key(finding):
+        secret = f"{finding.get('Raw', '')}\0{finding.get('RawV2', '')}"
+        return f"{finding.get('DetectorName')}:{hashlib.sha256(secret.encode()).hexdigest()}"
+
+    def _is_fresh(self, entry, now):
+        return now - entry["verified_on"] < self.ttl
+
+    def _get_database_table(self):
+        try:
+            import sqlalchemy
+        except ImportError as exception:
+            raise ImportError(
+                "sqlalchemy is required to store verification results in a database: install verification-cache.requirements.txt"
+            ) from exception
+
+        table = sqlalchemy.Table(
+            "verification_cache",
+            sqlalchemy.MetaData(),
+            sqlalchemy.Column("key", sqlalchemy.String, primary_key=True),
+            sqlalchemy.Column("detector_name", sqlalchemy.String, nullable=False),
+            sqlalchemy.Column("verified", sqlalchemy.Boolean, nullable=False),
+            sqlalchemy.Column("verified_on", sqlalchemy.DateTime, nullable=False),
+        )
+        return sqlalchemy.create_engine(self.database_url), table
+
+    def load(self):
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+
+        if os.path.isfile(self.file_path):
+            with open(self.file_path, "r") as file:
+                entries = json.load(file)
+            self.entries.update(
+                {k: v for k, v in entries.items() if self._is_fresh(v, now)}
+            )
+
+        if self.database_url:
+            engine, table = self._get_database_table()
+            oldest = datetime.datetime.fromtimestamp(
+                now - self.ttl, datetime.timezone.utc
+            ).replace(tzinfo=None)
+            with engine.connect() as connection:
+                rows = connection.execute(
+                    table.select().where(table.c.verified_on > oldest)
+                )
+                for row in rows:
+                    verified_on = row.verified_on.replace(
+                        tzinfo=datetime.timezone.utc
+                    ).timestamp()
+                    if verified_on > self.entries.get(row.key, {}).get(
+                        "verified_on", 0
+                    ):
+                        self.entries[row.key] = {
+                            "verified": row.verified,
+                            "verified_on": verified_on,
+                        }
+            engine.dispose()
+
+        common.log(
+            "INFO",
+            "SECRETS-FINDER (main)",
+            f"Verification cache loaded: {len(self.entries)} entr{'ies' if len(self.entries) != 1 else 'y'}",
+        )
+
+    def get(self, key):
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        with self.lock:
+            entry = self.entries.get(key)
+            return entry["verified"] if entry and self._is_fresh(entry, now) else None
+
+    def set(self, key, verified):
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        with self.lock:
+            self.entries[key] = {"verified": verified, "verified_on": now}
+            self.updated_keys.add(key)
+
+    def save(self):
+        now = datetime.datetime.now(datetime.timezone.utc).timestamp()
+        with self.lock:
+            entries = {k: v for k, v in self.entries.items() if self._is_fresh(v, now)}
+            updated_keys = [k for k in self.updated_keys if k in entries]
+
+        with open(self.file_path, "w") as file:
+            json.dump(entries, file)
+
+        if self.database_url and updated_keys:
+            engine, table = self._get_database_table()
+            with engine.begin() as connection:
+                connection.execute(table.delete().where(table.c.key.in_(updated_keys)))
+                connection.execute(
+                    table.insert(),
+                    [
+                        {
+                            "key": key,
+                            "detector_name": key.rsplit(":", 1)[0],
+                            "verified": entries[key]["verified"],
+                            "verified_on": datetime.datetime.fromtimestamp(
+                                entries[key]["verified_on"], datetime.timezone.utc
+                            ).replace(tzinfo=None),
+                        }
+                        for key in updated_keys
+                    ],
+                )
+            engine.dispose()
+
+        common.log(
+            "INFO",
+            "SECRETS-FINDER (main)",
+            f"Verification cache saved: {len(updated_keys)} new result{'s' if len(updated_keys) != 1 else ''}",
+        )
+
+
 class SecretsFinder:
     def __init__(
         self,
@@ -110,6 +418,9 @@ class SecretsFinder:
         trufflehog_executable_name="trufflehog",
         report_only_verified=False,
         concurrency=20,
+        deduplicate_fork_networks=False,
+        verification_cache_ttl=0,
+        verification_cache_database_url=None,
     ):
         self.scanner_folder = scanner_folder
         self.scan_identifier = scan_identifier
@@ -121,6 +432,16 @@ class SecretsFinder:
         self.trufflehog_executable_name = trufflehog_executable_name
         self.report_only_verified = report_only_verified
         self.concurrency = concurrency
+        self.deduplicate_fork_networks = deduplicate_fork_networks
+        self.verification_cache = (
+            VerificationCache(
+                os.path.join(scanner_folder, "verification-cache.json"),
+                verification_cache_ttl,
+                verification_cache_database_url,
+            )
+            if verification_cache_ttl > 0
+            else None
+        )
         self.status = "ready"
 
         scan_configuration_schema_path = os.path.join(
@@ -166,6 +487,7 @@ class SecretsFinder:
                 configuration_file="repositories_to_scan.json",
                 location=self.scanner_folder,
             )
+            self._load_verification_cache()
             self._scan_repositories(configuration)
             self.status = "success"
             common.log(
@@ -182,10 +504,37 @@ class SecretsFinder:
             )
         finally:
             self.end = datetime.datetime.now().isoformat()
+            self._save_verification_cache()
             self._save_all_results_to_file(location=self.scanner_folder)
 
         return self.status
 
+    def _load_verification_cache(self):
+        if not self.verification_cache:
+            return
+
+        try:
+            self.verification_cache.load()
+        except Exception as exception:
+            common.log(
+                "WARNING",
+                "SECRETS-FINDER (main)",
+                f"Verification cache could not be loaded: {str(exception)}",
+            )
+
+    def _save_verification_cache(self):
+        if not self.verification_cache:
+            return
+
+        try:
+            self.verification_cache.save()
+        except Exception as exception:
+            common.log(
+                "WARNING",
+                "SECRETS-FINDER (main)",
+                f"Verification cache could not be saved: {str(exception)}",
+            )
+
     def _check_for_credentials(self):
         if not os.environ.get("SECRETS_FINDER_SCAN_USERNAME") or not os.environ.get(
             "SECRETS_FINDER_SCAN_TOKEN"
@@ -237,12 +586,15 @@ class SecretsFinder:
             "SECRETS-FINDER (main)",
             f"Scanning {len(repositories)} repositor{'ies' if len(repositories) > 1 else 'y'} with {self.concurrency} worker{'s' if self.concurrency > 1 else ''}...",
         )
-        with concurrent.futures.ThreadPoolExecutor(
-            max_workers=self.concurrency
-        ) as executor:
-            for repository in repositories:
-                executor.submit(self._scan_repository, endpoint, repository)
-            executor.shutdown(wait=True)
+        if self.deduplicate_fork_networks:
+            self._scan_fork_networks(endpoint, repositories)
+        else:
+            with concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.concurrency
+            ) as executor:
+                for repository in repositories:
+                    executor.submit(self._scan_repository, endpoint, repository)
+                executor.shutdown(wait=True)
         common.log(
             "INFO", "SECRETS-FINDER (main)", "All repositories scanned successfully."
         )
@@ -261,7 +613,10 @@ class SecretsFinder:
                 f"Scanning repository: {repository_name} (organization: {repository_organization})",
             )
 
-            local_directory = self._clone_repository(endpoint, repository)
+            if repository.get("head"):
+                local_directory = self._fetch_repository_changes(endpoint, repository)
+            else:
+                local_directory = self._clone_repository(endpoint, repository)
 
             trufflehog_results = self._scan_local_git_repository(
                 local_directory, repository
@@ -286,7 +641,244 @@ class SecretsFinder:
             self.local_data.end = datetime.datetime.now().isoformat()
             self._save_error(repository_scan_identifier, repository)
 
-    def _clone_repository(self, endpoint, repository):
+    def _scan_fork_networks(self, endpoint, repositories):
+        """
+        Scans repositories grouped by fork network.
+
+        Root commits are first discovered concurrently from partial clones holding only commits,
+        which are deleted right away, and repositories are grouped by shared root commits. Each
+        network is then cloned and scanned on its own, so that disk usage is bounded by the
+        networks being scanned rather than the whole organization. The repositories of a network
+        are exposed through a single repository borrowing their objects with git alternates, so
+        that TruffleHog scans each shared commit only once. Findings are then attributed to every
+        repository whose branches or tags contain the commit.
+        """
+        candidates = [r for r in repositories if is_fork_network_candidate(r)]
+
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=self.concurrency
+        ) as executor:
+            for repository in repositories:
+                if not is_fork_network_candidate(repository):
+                    executor.submit(self._scan_repository, endpoint, repository)
+            discoveries = list(
+                executor.map(
+                    lambda repository: self._get_fork_network_root_commits(
+                        endpoint, repository
+                    ),
+                    candidates,
+                )
+            )
+
+            members = {
+                index: discovery
+                for index, discovery in enumerate(discoveries)
+                if discovery is not None
+            }
+            networks = group_fork_networks(
+                {index: member["root_commits"] for index, member in members.items()}
+            )
+            common.log(
+                "INFO",
+                "SECRETS-FINDER (main)",
+                f"{len(members)} repositor{'ies' if len(members) > 1 else 'y'} grouped in {len(networks)} fork network{'s' if len(networks) > 1 else ''}",
+            )
+
+            for network in networks:
+                executor.submit(
+                    self._scan_fork_network,
+                    endpoint,
+                    [
+                        {**members[index], "repository": candidates[index]}
+                        for index in network
+                    ],
+                )
+            executor.shutdown(wait=True)
+
+    def _get_fork_network_root_commits(self, endpoint, repository):
+        self.local_data.execution_id = str(uuid.uuid4())[:8]
+        self.local_data.start = datetime.datetime.now().isoformat()
+        try:
+            # Only commits are needed to find root commits, so trees and blobs are not fetched
+            local_directory = self._clone_repository(
+                endpoint, repository, bare=True, object_filter="tree:0"
+            )
+            try:
+                root_commits = common.run_command(
+                    f"git -C '{local_directory}' rev-list --max-parents=0 --all"
+                )[0]
+            finally:
+                self._delete_local_git_repository(local_directory)
+
+            return {
+                "root_commits": set(root_commits.split()) if root_commits else set(),
+                "start": self.local_data.start,
+            }
+        except Exception as exception:
+            common.log(
+                "ERROR",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"An error occurred while processing repository {repository.get('name')}: {str(exception)}",
+            )
+            self.local_data.end = datetime.datetime.now().isoformat()
+            self._save_error(common.generate_unique_identifier(), repository)
+            return None
+
+    def _clone_fork_network_members(self, endpoint, members):
+        cloned_members = []
+        for member in members:
+            repository = member["repository"]
+            try:
+                cloned_members.append(
+                    {
+                        **member,
+                        "local_directory": self._clone_repository(
+                            endpoint, repository, bare=True
+                        ),
+                    }
+                )
+            except Exception as exception:
+                common.log(
+                    "ERROR",
+                    f"SECRETS-FINDER ({self.local_data.execution_id})",
+                    f"An error occurred while processing repository {repository.get('name')}: {str(exception)}",
+                )
+                self.local_data.start = member["start"]
+                self.local_data.end = datetime.datetime.now().isoformat()
+                self._save_error(common.generate_unique_identifier(), repository)
+        return cloned_members
+
+    def _scan_fork_network(self, endpoint, members):
+        self.local_data.execution_id = str(uuid.uuid4())[:8]
+        network_directory = None
+        members = self._clone_fork_network_members(endpoint, members)
+        if not members:
+            return
+
+        try:
+            if len(members) == 1:
+                self.local_data.start = members[0]["start"]
+                network_directory = members[0]["local_directory"]
+            else:
+                self.local_data.start = min(member["start"] for member in members)
+                network_directory = self._create_fork_network_repository(members)
+
+            common.log(
+                "INFO",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"Scanning fork network of {len(members)} repositor{'ies' if len(members) > 1 else 'y'}: {', '.join(member['repository'].get('organization') + '/' + member['repository'].get('name') for member in members)}",
+            )
+
+            trufflehog_results = self._scan_local_git_repository(
+                network_directory, {}, delete_local_directory=False
+            )
+            attributed_results = self._attribute_fork_network_findings(
+                network_directory, members, trufflehog_results
+            )
+
+            # Findings attributed to several repositories share the same record
+            findings = {}
+            for line in trufflehog_results:
+                try:
+                    if line:
+                        findings[line] = Finding(json.loads(line))
+                except Exception:
+                    continue
+            attributed_results = [
+                [findings[line] for line in lines if line in findings]
+                for lines in attributed_results
+            ]
+
+            self.local_data.end = datetime.datetime.now().isoformat()
+            for index, member in enumerate(members):
+                self._save_scan_results(
+                    common.generate_unique_identifier(),
+                    member["repository"],
+                    "findings",
+                    attributed_results[index],
+                )
+        except Exception as exception:
+            common.log(
+                "ERROR",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"An error occurred while processing fork network: {str(exception)}",
+            )
+            self.local_data.end = datetime.datetime.now().isoformat()
+            for member in members:
+                self._save_error(
+                    common.generate_unique_identifier(), member["repository"]
+                )
+        finally:
+            for member in members:
+                self._delete_local_git_repository(member["local_directory"])
+            if network_directory and len(members) > 1:
+                self._delete_local_git_repository(network_directory)
+
+    def _create_fork_network_repository(self, members):
+        network_directory = tempfile.mkdtemp()
+        try:
+            common.run_command(f"git init -q --bare '{network_directory}'")
+            with open(
+                os.path.join(network_directory, "objects", "info", "alternates"), "w"
+            ) as file:
+                for member in members:
+                    file.write(
+                        f"{os.path.join(member['local_directory'], 'objects')}\n"
+                    )
+
+            # Objects are all available through the alternates, so only references are fetched
+            for index, member in enumerate(members):
+                common.run_command(
+                    f"git -C '{network_directory}' fetch -q --no-tags '{member['local_directory']}' '+refs/heads/*:refs/heads/{index}/*' '+refs/tags/*:refs/tags/{index}/*'"
+                )
+
+            common.log(
+                "DEBUG",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"Fork network repository created: {network_directory}",
+            )
+            return network_directory
+        except Exception:
+            self._delete_local_git_repository(network_directory)
+            raise
+
+    def _attribute_fork_network_findings(
+        self, network_directory, members, trufflehog_results
+    ):
+        attributed_results = [[] for _ in members]
+        containing_members = {}
+
+        for line in trufflehog_results:
+            if not line:
+                continue
+
+            try:
+                commit = json.loads(line)["SourceMetadata"]["Data"]["Git"]["commit"]
+            except Exception:
+                commit = None
+
+            if len(members) == 1:
+                indexes = {0}
+            elif not commit:
+                indexes = set(range(len(members)))
+            elif commit in containing_members:
+                indexes = containing_members[commit]
+            else:
+                references = common.run_command(
+                    f"git -C '{network_directory}' for-each-ref --contains={commit} --format=%(refname) refs/heads refs/tags"
+                )[0]
+                indexes = {
+                    int(reference.split("/")[2])
+                    for reference in (references.splitlines() if references else [])
+                }
+                containing_members[commit] = indexes
+
+            for index in indexes:
+                attributed_results[index].append(line)
+
+        return attributed_results
+
+    def _clone_repository(self, endpoint, repository, bare=False, object_filter=None):
         repository_organization = repository.get("organization")
         repository_name = repository.get("name")
         git_repository_url = endpoint.format(
@@ -299,6 +891,36 @@ class SecretsFinder:
             f"Cloning repository: {git_repository_url}",
         )
 
+        env = self._get_git_environment()
+
+        temporary_directory = tempfile.mkdtemp()
+        common.log(
+            "DEBUG",
+            f"SECRETS-FINDER ({self.local_data.execution_id})",
+            f"Temporary directory created: {temporary_directory}",
+        )
+
+        try:
+            common.log(
+                "DEBUG",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"Cloning repository: {git_repository_url}",
+            )
+            common.run_command(
+                f"git clone {'--bare ' if bare else ''}{f'--filter={object_filter} ' if object_filter else ''}'{git_repository_url}' '{temporary_directory}'",
+                env=env,
+            )
+            common.log(
+                "DEBUG",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"Repository cloned: {git_repository_url}",
+            )
+            return temporary_directory
+        except Exception:
+            self._delete_local_git_repository(temporary_directory)
+            raise
+
+    def _get_git_environment(self):
         env = os.environ.copy()
         env["GIT_TERMINAL_PROMPT"] = "0"
         env["GIT_ASKPASS"] = os.path.join(
@@ -308,41 +930,88 @@ class SecretsFinder:
             "SECRETS_FINDER_SCAN_USERNAME"
         )
         env["SECRETS_FINDER_SCAN_TOKEN"] = os.environ.get("SECRETS_FINDER_SCAN_TOKEN")
+        return env
+
+    def _fetch_repository_changes(self, endpoint, repository):
+        """
+        Fetches only the commits between the base and the head of a repository.
+
+        When the base is a commit (push), it is fetched with a depth of 1 so that the fetch of the
+        head is negotiated against it and only brings the new commits. When the base is a branch
+        (pull request), the head is fetched with --shallow-exclude, so the local history is made
+        of the commits of the head which are not reachable from the base.
+        """
+        repository_organization = repository.get("organization")
+        repository_name = repository.get("name")
+        git_repository_url = endpoint.format(
+            organization=repository_organization, repository=repository_name
+        )
+        base = repository.get("base")
+        head = repository.get("head")
 
-        temporary_directory = tempfile.mkdtemp()
         common.log(
             "DEBUG",
             f"SECRETS-FINDER ({self.local_data.execution_id})",
-            f"Temporary directory created: {temporary_directory}",
+            f"Fetching changes of repository: {git_repository_url} (base: {base}, head: {head})",
         )
 
+        env = self._get_git_environment()
+        temporary_directory = tempfile.mkdtemp()
+        git = f"git -C '{temporary_directory}'"
+
         try:
-            common.log(
-                "DEBUG",
-                f"SECRETS-FINDER ({self.local_data.execution_id})",
-                f"Cloning repository: {git_repository_url}",
-            )
+            common.run_command(f"git init -q '{temporary_directory}'", env=env)
             common.run_command(
-                f"git clone '{git_repository_url}' '{temporary_directory}'", env=env
+                f"{git} remote add origin '{git_repository_url}'", env=env
             )
+
+            head_refspec = f"'{head}:refs/heads/{DIFF_SCAN_BRANCH}'"
+            if is_diff_scan_base_commit(base):
+                common.run_command(
+                    f"{git} fetch -q --no-tags --depth=1 origin '{base}'", env=env
+                )
+                common.run_command(
+                    f"{git} fetch -q --no-tags origin {head_refspec}", env=env
+                )
+            elif base and not is_null_commit(base):
+                common.run_command(
+                    f"{git} fetch -q --no-tags --shallow-exclude='{base}' origin {head_refspec}",
+                    env=env,
+                )
+            else:
+                common.run_command(
+                    f"{git} fetch -q --no-tags origin {head_refspec}", env=env
+                )
+
             common.log(
                 "DEBUG",
                 f"SECRETS-FINDER ({self.local_data.execution_id})",
-                f"Repository cloned: {git_repository_url}",
+                f"Changes of repository fetched: {git_repository_url}",
             )
             return temporary_directory
         except Exception:
             self._delete_local_git_repository(temporary_directory)
             raise
 
-    def _scan_local_git_repository(self, local_directory, repository):
+    def _scan_local_git_repository(
+        self, local_directory, repository, delete_local_directory=True
+    ):
         try:
             repository_since_commit = repository.get("since-commit")
             repository_branch = repository.get("branch")
             repository_max_depth = repository.get("max-depth")
 
+            # In diff-scoped scans, the local repository only holds the changes to scan
+            if repository.get("head"):
+                repository_branch = DIFF_SCAN_BRANCH
+                if is_diff_scan_base_commit(repository.get("base")):
+                    repository_since_commit = repository.get("base")
+
             trufflehog_command = f"{os.path.join(self.trufflehog_installation_path, self.trufflehog_executable_name)} git --no-update --json"
-            if self.report_only_verified:
+            if self.verification_cache:
+                # Secrets are verified afterwards, only when not found in the verification cache
+                trufflehog_command += " --no-verification"
+            elif self.report_only_verified:
                 trufflehog_command += " --only-verified"
             if repository_since_commit:
                 trufflehog_command += f" --since-commit={repository_since_commit}"
@@ -365,26 +1034,130 @@ class SecretsFinder:
             except Exception as e:
                 raise Exception(str(e))
 
-            trufflehog_logs = (
-                execution_output[1].splitlines() if execution_output[1] else []
-            )
-            for line in trufflehog_logs:
-                try:
-                    if line:
-                        common.log(
-                            "DEBUG",
-                            f"TRUFFLEHOG ({self.local_data.execution_id})",
-                            line,
-                        )
-                except Exception as e:
-                    continue
+            # TruffleHog output is only logged at debug level, so it is not split otherwise
+            if execution_output[1] and common.is_log_enabled("DEBUG"):
+                context = f"TRUFFLEHOG ({self.local_data.execution_id})"
+                for line in execution_output[1].splitlines():
+                    try:
+                        if line:
+                            common.log("DEBUG", context, line)
+                    except Exception as e:
+                        continue
 
             trufflehog_results = (
                 execution_output[0].splitlines() if execution_output[0] else []
             )
+            if self.verification_cache:
+                trufflehog_results = self._verify_findings(
+                    local_directory, trufflehog_results
+                )
             return trufflehog_results
         finally:
-            self._delete_local_git_repository(local_directory)
+            if delete_local_directory:
+                self._delete_local_git_repository(local_directory)
+
+    def _verify_findings(self, local_directory, trufflehog_results):
+        """
+        Sets the verification status of findings reported by a scan run without verification.
+
+        Statuses are taken from the verification cache when available. Other secrets are verified
+        by scanning with TruffleHog the files in which they were found, as they were in the commit
+        reporting them, and the results are added to the cache.
+        """
+        findings = []
+        for line in trufflehog_results:
+            try:
+                if line:
+                    findings.append(json.loads(line))
+            except Exception:
+                continue
+
+        keys = [VerificationCache.get_key(finding) for finding in findings]
+        statuses = {key: self.verification_cache.get(key) for key in set(keys)}
+        locations = {}
+        for finding, key in zip(findings, keys):
+            if statuses[key] is None:
+                git = finding.get("SourceMetadata", {}).get("Data", {}).get("Git", {})
+                if git.get("commit") and git.get("file"):
+                    locations.setdefault(key, set()).add(
+                        (git.get("commit"), git.get("file"))
+                    )
+
+        common.log(
+            "DEBUG",
+            f"SECRETS-FINDER ({self.local_data.execution_id})",
+            f"Verification cache hits: {sum(1 for status in statuses.values() if status is not None)}/{len(statuses)}",
+        )
+
+        if locations:
+            for key, verified in self._verify_secrets(
+                local_directory, locations
+            ).items():
+                statuses[key] = verified
+                self.verification_cache.set(key, verified)
+
+        results = []
+        for finding, key in zip(findings, keys):
+            finding["Verified"] = bool(statuses[key])
+            if finding["Verified"] or not self.report_only_verified:
+                results.append(json.dumps(finding))
+        return results
+
+    def _verify_secrets(self, local_directory, locations):
+        temporary_directory = tempfile.mkdtemp()
+        try:
+            files = sorted(set().union(*locations.values()))
+            for index, (commit, file) in enumerate(files):
+                destination = os.path.join(temporary_directory, str(index))
+                os.makedirs(destination)
+                common.run_command(
+                    f"git -C '{local_directory}' show '{commit}:{file}'",
+                    output_file=os.path.join(destination, os.path.basename(file)),
+                )
+
+            trufflehog_command = f"{os.path.join(self.trufflehog_installation_path, self.trufflehog_executable_name)} filesystem --no-update --json"
+            if os.path.isfile(os.path.join(self.scanner_folder, "configuration.yaml")):
+                trufflehog_command += f" --config={os.path.join(self.scanner_folder, 'configuration.yaml')}"
+            trufflehog_command += f" {temporary_directory}"
+
+            common.log(
+                "DEBUG",
+                f"SECRETS-FINDER ({self.local_data.execution_id})",
+                f"Verifying {len(locations)} secret{'s' if len(locations) > 1 else ''} found in {len(files)} file{'s' if len(files) > 1 else ''}: {trufflehog_command}",
+            )
+            execution_output = common.run_command(trufflehog_command)
+
+            # Secrets not detected again, or whose verification failed without being
+            # verified elsewhere, keep an unknown status and are not cached
+            verified = {}
+            errors = set()
+            for line in (execution_output[0] or "").splitlines():
+                try:
+                    finding = json.loads(line)
+                except Exception:
+                    continue
+                key = VerificationCache.get_key(finding)
+                if key not in locations:
+                    continue
+                if finding.get("Verified"):
+                    verified[key] = True
+                elif finding.get("VerificationError"):
+                    errors.add(key)
+                else:
+                    verified.setdefault(key, False)
+
+            errors = {key for key in errors if not verified.get(key)}
+            if errors:
+                common.log(
+                    "WARNING",
+                    f"SECRETS-FINDER ({self.local_data.execution_id})",
+                    f"Verification failed for {len(errors)} secret{'s' if len(errors) > 1 else ''}, which are reported as unverified and not cached",
+                )
+            return {
+                key: status for key, status in verified.items() if key not in errors
+            }
+        finally:
+            common.run_command(f"rm -rf '{temporary_directory}'")
 
     def _delete_local_git_repository(self, local_directory):
         try:
@@ -433,9 +1206,13 @@ class SecretsFinder:
         nb_secrets_found = 0
         for line in results_to_process:
             try:
-                if line:
-                    nb_secrets_found += 1
-                    scan_results.append(json.loads(line))
+                if isinstance(line, Finding):
+                    scan_results.append(line)
+                elif line:
+                    scan_results.append(Finding(json.loads(line)))
+                else:
+                    continue
+                nb_secrets_found += 1
             except Exception:
                 continue
 
@@ -500,6 +1277,7 @@ class SecretsFinder:
                     "results": self.scan_results if self.status == "success" else [],
                 },
                 file,
+                default=serialize_finding,
             )
             file.write("\n")
 
@@ -510,7 +1288,9 @@ class SecretsFinder:
         )
 
 
-def run_python_scripts_provided_by_user(lifecycle, folder, raise_on_error):
+def run_python_scripts_provided_by_user(
+    lifecycle, folder, raise_on_error, cache_folder=None, max_workers=1
+):
     try:
         accepted_lifefycles = ["pre", "post"]
         if lifecycle not in accepted_lifefycles:
@@ -523,7 +1303,13 @@ def run_python_scripts_provided_by_user(lifecycle, folder, raise_on_error):
             "SECRETS-FINDER (main)",
             f"Executing {lifecycle}-scan scripts provided by user...",
         )
-        common.run_python_scripts(folder, f"{lifecycle}_*.py")
+        common.run_python_scripts(
+            folder,
+            f"{lifecycle}_*.py",
+            cache_folder=cache_folder,
+            max_workers=max_workers,
+            output_folder=os.path.join(folder, "logs"),
+        )
         common.log(
             "INFO",
             "SECRETS-FINDER (main)",
@@ -548,10 +1334,15 @@ def main():
             environment_file="scanner.env",
         )
         arguments = configure_parser()
+        log_sink = arguments.log_sink
+        if log_sink and log_sink.startswith("s3://"):
+            log_sink = f"{log_sink.rstrip('/')}/{arguments.scan_uuid}/stream"
         common.configure_logging(
             destination_folder=os.path.join(arguments.scanner_folder, "logs"),
             log_file="secrets-finder.log",
             level=logging.INFO if not arguments.debug else logging.DEBUG,
+            asynchronous=True,
+            sink=log_sink,
         )
     except Exception as exception:
         print(
@@ -560,8 +1351,15 @@ def main():
         sys.exit(2)
 
     try:
+        python_cache_folder = os.path.join(
+            arguments.scanner_folder, common.PYTHON_CACHE_FOLDER
+        )
         run_python_scripts_provided_by_user(
-            "pre", arguments.scan_folder, arguments.exit_on_error_pre
+            "pre",
+            arguments.scan_folder,
+            arguments.exit_on_error_pre,
+            cache_folder=python_cache_folder,
+            max_workers=arguments.user_scripts_concurrency,
         )
         finder = SecretsFinder(
             scanner_folder=arguments.scanner_folder,
@@ -571,10 +1369,17 @@ def main():
             trufflehog_installation_path=arguments.trufflehog_installation_path,
             trufflehog_executable_name=arguments.trufflehog_executable_name,
             report_only_verified=arguments.report_only_verified,
+            deduplicate_fork_networks=arguments.deduplicate_fork_networks,
+            verification_cache_ttl=arguments.verification_cache_ttl,
+            verification_cache_database_url=arguments.verification_cache_database_url,
         )
         finder.scan()
         run_python_scripts_provided_by_user(
-            "post", arguments.scan_folder, arguments.exit_on_error_post
+            "post",
+            arguments.scan_folder,
+            arguments.exit_on_error_post,
+            cache_folder=python_cache_folder,
+            max_workers=arguments.user_scripts_concurrency,
         )
         sys.exit(0)
     except Exception as exception:
@@ -15,3 +15,24 @@ resource "aws_cloudwatch_event_target" "ingestion_sfn_trigger" {
     aws_iam_role_policy.cloudwatch_policy,
   ]
 }
+
+resource "aws_cloudwatch_event_rule" "revalidation_trigger_rule" {
+  name                = "${var.project_name}-revalidation-trigger"
+  description         = "Triggers the revalidation of findings on schedule"
+  schedule_expression = var.revalidation_schedule
+  state               = var.disable_revalidation_schedule ? "DISABLED" : "ENABLED"
+}
+
+resource "aws_cloudwatch_event_target" "revalidation_trigger" {
+  rule  = aws_cloudwatch_event_rule.revalidation_trigger_rule.name
+  arn   = aws_lambda_function.ingestion-lambda.arn
+  input = jsonencode({ action = "revalidate_findings" })
+}
+
+resource "aws_lambda_permission" "revalidation_trigger" {
+  statement_id  = "AllowExecutionFromCloudWatchRevalidationRule"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.ingestion-lambda.function_name
+  principal     = "events.amazonaws.com"
+  source_arn    = aws_cloudwatch_event_rule.revalidation_trigger_rule.arn
+}
@@ -36,8 +36,10 @@ resource "aws_lambda_function" "ingestion-lambda" {
 
   environment {
     variables = {
-      BUCKET_NAME = var.s3_bucket_name
-      DB_URL      = local.db_url
+      BUCKET_NAME              = var.s3_bucket_name
+      DB_URL                   = local.db_url
+      REVALIDATION_MAX_WORKERS = var.revalidation_max_workers
+      REVALIDATION_RATE_LIMIT  = var.revalidation_rate_limit
     }
   }
 
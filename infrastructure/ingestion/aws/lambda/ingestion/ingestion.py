@@ -3,6 +3,7 @@ from typing import List, Dict, Any, Callable, Union
 import logging
 from modules.common.s3 import S3
 from modules.findings_ingestion import ingest_findings
+from modules.findings_revalidation import revalidate_findings
 
 logging.basicConfig(
     level=logging.INFO,
@@ -12,6 +13,8 @@ logging.basicConfig(
 
 bucket_name: str = os.environ.get("BUCKET_NAME")
 db_url: str = os.environ.get("DB_URL")
+revalidation_max_workers: int = int(os.environ.get("REVALIDATION_MAX_WORKERS", 8))
+revalidation_rate_limit: float = float(os.environ.get("REVALIDATION_RATE_LIMIT", 1))
 
 ingestion_callback_mapping: Dict[str, Callable[[str, str, str], bool]] = {
     "ingest_findings": ingest_findings
@@ -49,6 +52,16 @@ def handler(event: Dict[str, Any], _) -> Dict[str, Any]:
         response: Dict[str, Union[int, Dict[str, List[str]]]] = list_files(prefix)
         return response
 
+    elif action == "revalidate_findings":
+        statistics: Dict[str, int] = revalidate_findings(
+            db_url,
+            batch_size=int(event.get("batch_size", 100)),
+            max_workers=revalidation_max_workers,
+            rate_limit=revalidation_rate_limit,
+            max_duration=int(event.get("max_duration", 600)),
+        )
+        return {"statusCode": 200, "body": statistics}
+
     elif action in ingestion_callback_mapping:
         file_key: str = event.get("file_key")
         if not file_key:
@@ -1,7 +1,13 @@
 import os
+import shutil
 import tempfile
+import zlib
 import boto3
-from typing import List, Tuple
+import zstandard
+from typing import Dict, List, Tuple
+
+# Extensions used for compressed files, mapped to the Content-Encoding they are stored with
+COMPRESSION_EXTENSIONS: Dict[str, str] = {".gz": "gzip", ".zst": "zstd"}
 
 
 class S3:
@@ -78,6 +84,9 @@ class S3:
         """
         Downloads the file with the specified key from the bucket.
 
+        Files stored with a gzip or zstd Content-Encoding (or with a .gz or .zst extension)
+        are decompressed while being downloaded, and saved without their extension.
+
         Args:
             file_key (str): The key of the file to download.
 
@@ -86,10 +95,44 @@ class S3:
 
         """
         file_name: str = os.path.basename(file_key)
+        name, extension = os.path.splitext(file_name)
+        response: dict = self.client.get_object(Bucket=self.bucket_name, Key=file_key)
+        content_encoding: str = response.get(
+            "ContentEncoding"
+        ) or COMPRESSION_EXTENSIONS.get(extension)
+
+        if (
+            content_encoding
+            and COMPRESSION_EXTENSIONS.get(extension) == content_encoding
+        ):
+            file_name = name
+
         local_path: str = os.path.join(tempfile.gettempdir(), file_name)
-        self.client.download_file(self.bucket_name, file_key, local_path)
+        with open(local_path, "wb") as file:
+            self._write_decompressed(response["Body"], file, content_encoding)
         return local_path
 
+    def _write_decompressed(self, body, file, content_encoding: str) -> None:
+        """
+        Writes the content of a streaming body to a file, decompressing it if needed.
+
+        Args:
+            body (botocore.response.StreamingBody): The body of the object to write.
+            file (BinaryIO): The file to write to.
+            content_encoding (str): The Content-Encoding of the object, if any.
+
+        """
+        if content_encoding == "gzip":
+            # wbits=47 accepts both gzip and zlib headers
+            decompressor = zlib.decompressobj(wbits=47)
+            for chunk in body.iter_chunks(chunk_size=1024 * 1024):
+                file.write(decompressor.decompress(chunk))
+            file.write(decompressor.flush())
+        elif content_encoding == "zstd":
+            zstandard.ZstdDecompressor().copy_stream(body, file)
+        else:
+            shutil.copyfileobj(body, file)
+
     def download_first_file(self, prefix: str) -> Tuple[str, str]:
         """
         Downloads the first file with the specified prefix from the bucket.
@@ -0,0 +1,264 @@
+import concurrent.futures
+import datetime
+import json
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import bindparam, create_engine, func, select, update
+from modules.findings_ingestion import Finding
+
+# TruffleHog binary packaged with the Lambda function (see Dockerfile)
+TRUFFLEHOG_PATH: str = os.environ.get(
+    "TRUFFLEHOG_PATH",
+    os.path.join(os.path.dirname(os.path.dirname(__file__)), "bin", "trufflehog"),
+)
+
+Secret = Tuple[str, str, Optional[str]]
+
+
+class RateLimiter:
+    """
+    Limits the number of verifications performed per second for each detector.
+
+    Args:
+        rate (float): The maximum number of verifications per second for a detector.
+
+    """
+
+    def __init__(self, rate: float) -> None:
+        self.interval: float = 1 / rate if rate > 0 else 0
+        self.next_slots: Dict[str, float] = {}
+        self.lock: threading.Lock = threading.Lock()
+
+    def wait(self, detector_name: str) -> None:
+        """
+        Blocks until a verification can be performed for the detector.
+
+        Args:
+            detector_name (str): The name of the detector.
+
+        """
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slots.get(detector_name, now))
+            self.next_slots[detector_name] = slot + self.interval
+        time.sleep(max(0, slot - now))
+
+
+def get_trufflehog_executable() -> str:
+    """
+    Returns the path of an executable TruffleHog binary.
+
+    Files extracted from Lambda archives may lose their executable bit, in which case the binary
+    is copied to the temporary directory and made executable. The copy is renamed into place once
+    complete, so an executable found there is never partially written.
+
+    Returns:
+        str: The path of the TruffleHog binary.
+    """
+    if os.access(TRUFFLEHOG_PATH, os.X_OK):
+        return TRUFFLEHOG_PATH
+
+    executable = os.path.join(tempfile.gettempdir(), "trufflehog")
+    if not os.access(executable, os.X_OK):
+        temporary_executable = f"{executable}.{os.getpid()}.tmp"
+        shutil.copyfile(TRUFFLEHOG_PATH, temporary_executable)
+        os.chmod(temporary_executable, 0o755)
+        os.replace(temporary_executable, executable)
+    return executable
+
+
+def verify_secret(secret: Secret, trufflehog_executable: str) -> Optional[bool]:
+    """
+    Verifies a secret by scanning it again with TruffleHog, restricted to its detector.
+
+    Only the secret is stored with findings, while many detectors match a secret only when one
+    of their keywords precedes it. The secret is therefore written both alone and prefixed with
+    the detector name, which is a keyword of most detectors. Secrets of detectors using other
+    keywords are not detected again, and are logged and left unverified.
+
+    Args:
+        secret (Secret): The detector name, raw and raw_v2 values of the secret.
+        trufflehog_executable (str): The path of the TruffleHog binary.
+
+    Returns:
+        Optional[bool]: Whether the secret is still valid, or None if it could not be verified.
+    """
+    detector_name, raw, raw_v2 = secret
+    values = [raw] + ([raw_v2] if raw_v2 and raw_v2 != raw else [])
+
+    with tempfile.TemporaryDirectory() as directory:
+        with open(os.path.join(directory, "secret"), "w") as file:
+            for value in values:
+                file.write(f"{value}\n")
+                file.write(f"{detector_name.lower()} = {value}\n")
+
+        process = subprocess.run(
+            [
+                trufflehog_executable,
+                "filesystem",
+                "--no-update",
+                "--json",
+                f"--include-detectors={detector_name}",
+                directory,
+            ],
+            capture_output=True,
+            text=True,
+        )
+
+    if process.returncode != 0:
+        logging.error(
+            f"Error verifying secret for detector {detector_name}: {process.stderr}"
+        )
+        return None
+
+    # A secret is no longer valid only if every verification completed without error
+    detected = False
+    errors = []
+    for line in process.stdout.splitlines():
+        try:
+            result = json.loads(line)
+        except ValueError:
+            continue
+
+        if result.get("DetectorName") != detector_name or result.get("Raw") != raw:
+            continue
+
+        if result.get("Verified"):
+            return True
+
+        detected = True
+        if result.get("VerificationError"):
+            errors.append(result["VerificationError"])
+
+    if not detected:
+        logging.warning(
+            f"Secret not detected again by detector {detector_name}, which cannot be revalidated without the original context of the secret"
+        )
+        return None
+
+    if errors:
+        logging.warning(
+            f"Error verifying secret for detector {detector_name}: {errors[0]}"
+        )
+        return None
+
+    return False
+
+
+def revalidate_findings(
+    db_url: str,
+    batch_size: int = 100,
+    max_workers: int = 8,
+    rate_limit: float = 1,
+    max_duration: int = 600,
+) -> Dict[str, int]:
+    """
+    Verifies again the secrets of findings that were still valid, and updates their validity.
+
+    Distinct secrets are read in batches, starting with those validated the longest time ago, and
+    each of them is verified once, whatever the number of findings sharing it. No new batch is
+    started once max_duration is exceeded: remaining secrets are verified on the next run.
+
+    Args:
+        db_url (str): The URL of the database to connect to.
+        batch_size (int): The number of distinct secrets verified per batch.
+        max_workers (int): The maximum number of secrets verified concurrently.
+        rate_limit (float): The maximum number of verifications per second for a detector.
+        max_duration (int): The number of seconds after which no new batch is started.
+
+    Returns:
+        Dict[str, int]: The number of secrets still valid, no longer valid and not verified.
+    """
+    engine = create_engine(db_url)
+    started_on = datetime.datetime.now()
+    deadline = time.monotonic() + max_duration
+    rate_limiter = RateLimiter(rate_limit)
+    # Resolved once, as workers must not copy the binary while others are running it
+    trufflehog_executable = get_trufflehog_executable()
+    statistics = {"still_valid": 0, "no_longer_valid": 0, "not_verified": 0}
+
+    # Secrets which could not be verified keep their position in the ordering, so they are skipped
+    # with an offset; others leave the selection once their last validation date is updated.
+    query = (
+        select(Finding.detector_name, Finding.raw, Finding.raw_v2)
+        .where(
+            Finding.verified.is_(True),
+            Finding.is_still_valid.is_(True),
+            Finding.last_validated_on < started_on,
+        )
+        .group_by(Finding.detector_name, Finding.raw, Finding.raw_v2)
+        .order_by(
+            func.min(Finding.last_validated_on),
+            Finding.detector_name,
+            Finding.raw,
+            Finding.raw_v2,
+        )
+        .limit(batch_size)
+    )
+
+    statement = (
+        update(Finding.__table__)
+        .where(
+            Finding.detector_name == bindparam("b_detector_name"),
+            Finding.raw == bindparam("b_raw"),
+            Finding.raw_v2.is_not_distinct_from(bindparam("b_raw_v2")),
+            Finding.verified.is_(True),
+            Finding.is_still_valid.is_(True),
+        )
+        .values(
+            is_still_valid=bindparam("b_is_still_valid"),
+            last_validated_on=bindparam("b_last_validated_on"),
+        )
+    )
+
+    def verify(secret: Secret) -> Optional[bool]:
+        rate_limiter.wait(secret[0])
+        return verify_secret(secret, trufflehog_executable)
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+        while time.monotonic() < deadline:
+            with engine.connect() as connection:
+                secrets: List[Secret] = [
+                    tuple(row)
+                    for row in connection.execute(
+                        query.offset(statistics["not_verified"])
+                    )
+                ]
+
+            if not secrets:
+                break
+
+            logging.info(f"Verifying {len(secrets)} secrets")
+            results = list(executor.map(verify, secrets))
+            validated_on = datetime.datetime.now()
+
+            parameters = []
+            for (detector_name, raw, raw_v2), verified in zip(secrets, results):
+                if verified is None:
+                    statistics["not_verified"] += 1
+                    continue
+
+                statistics["still_valid" if verified else "no_longer_valid"] += 1
+                parameters.append(
+                    {
+                        "b_detector_name": detector_name,
+                        "b_raw": raw,
+                        "b_raw_v2": raw_v2,
+                        "b_is_still_valid": verified,
+                        "b_last_validated_on": validated_on,
+                    }
+                )
+
+            if parameters:
+                with engine.begin() as connection:
+                    connection.execute(statement, parameters)
+
+    engine.dispose()
+    logging.info(f"Findings revalidated: {statistics}")
+    return statistics
@@ -113,3 +113,42 @@ variable "disable_ingestion_schedule" {
   description = "Disable the ingestion schedule"
   default     = false
 }
+
+variable "revalidation_schedule" {
+  type        = string
+  description = "Cron schedule for the CloudWatch Event Rule triggering the revalidation of findings still valid"
+  default     = "rate(24 hours)"
+
+  validation {
+    condition     = can(regex("^(rate|cron)\\(\\d+ (minutes|hours|days)\\)$", var.revalidation_schedule))
+    error_message = "The revalidation schedule should be in the format 'rate(n minutes|hours|days)' or 'cron(expression)', where n is a positive integer"
+  }
+}
+
+variable "disable_revalidation_schedule" {
+  type        = bool
+  description = "Disable the revalidation schedule"
+  default     = false
+}
+
+variable "revalidation_max_workers" {
+  type        = number
+  description = "Maximum number of secrets verified concurrently when revalidating findings"
+  default     = 8
+
+  validation {
+    condition     = var.revalidation_max_workers >= 1 && floor(var.revalidation_max_workers) == var.revalidation_max_workers
+    error_message = "The maximum number of workers should be an integer greater than or equal to 1"
+  }
+}
+
+variable "revalidation_rate_limit" {
+  type        = number
+  description = "Maximum number of secrets verified per second for each detector when revalidating findings"
+  default     = 1
+
+  validation {
+    condition     = var.revalidation_rate_limit > 0
+    error_message = "The revalidation rate limit should be greater than 0"
+  }
+}
@@ -5,6 +5,14 @@ resource "aws_cloudwatch_log_group" "logs" {
   kms_key_id = var.kms_key_arn
 }
 
+resource "aws_cloudwatch_log_group" "consumer_logs" {
+  count             = local.events_queue_enabled ? 1 : 0
+  name              = "/aws/lambda/${aws_lambda_function.github_app_event_consumer[0].function_name}"
+  retention_in_days = 30
+
+  kms_key_id = var.kms_key_arn
+}
+
 resource "aws_cloudwatch_log_group" "waf_log_group" {
   count             = var.create_waf_log_group ? 1 : 0
   name              = var.waf_log_group_name
@@ -0,0 +1,20 @@
+resource "aws_dynamodb_table" "pending_events" {
+  count        = local.event_coalescing_enabled ? 1 : 0
+  name         = "${var.project_name}-pending-events"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "coalescing_key"
+
+  attribute {
+    name = "coalescing_key"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expires_on"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled = true
+  }
+}
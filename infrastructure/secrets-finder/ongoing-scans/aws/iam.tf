@@ -47,6 +47,35 @@ data "aws_iam_policy_document" "permissions_for_execution_role" {
     resources = [data.aws_secretsmanager_secret.github_app_secret.arn]
   }
 
+  dynamic "statement" {
+    for_each = local.events_queue_enabled ? [aws_sqs_queue.events[0].arn] : []
+    content {
+      sid    = "SendAndReceiveEvents"
+      effect = "Allow"
+      actions = [
+        "sqs:SendMessage",
+        "sqs:ReceiveMessage",
+        "sqs:DeleteMessage",
+        "sqs:GetQueueAttributes"
+      ]
+      resources = [aws_sqs_queue.events[0].arn]
+    }
+  }
+
+  dynamic "statement" {
+    for_each = local.event_coalescing_enabled ? [aws_dynamodb_table.pending_events[0].arn] : []
+    content {
+      sid    = "ManagePendingEvents"
+      effect = "Allow"
+      actions = [
+        "dynamodb:GetItem",
+        "dynamodb:PutItem",
+        "dynamodb:DeleteItem"
+      ]
+      resources = [aws_dynamodb_table.pending_events[0].arn]
+    }
+  }
+
   statement {
     sid    = "WriteToCloudWatchLogGroup"
     effect = "Allow"
@@ -19,6 +19,9 @@ resource "aws_lambda_function" "github_app_event_handler" {
       SECRETS_FINDER_GITHUB_APP_SECRET_REFERENCE = var.github_app_secret_reference
       GITHUB_ORGANIZATION                        = var.github_secret_prevention_workflow_org
       GITHUB_REPOSITORY                          = var.github_secret_prevention_workflow_repository
+      SECRETS_FINDER_SECRETS_CACHE_TTL           = var.secrets_cache_ttl
+      SECRETS_FINDER_EVENTS_QUEUE_URL            = local.events_queue_enabled ? aws_sqs_queue.events[0].url : null
+      SECRETS_FINDER_PENDING_EVENTS_TABLE        = local.event_coalescing_enabled ? aws_dynamodb_table.pending_events[0].name : null
 
       DD_SITE               = var.datadog_api_key_reference != null ? "datadoghq.com" : null
       DD_API_KEY_SECRET_ARN = var.datadog_api_key_reference != null ? data.aws_secretsmanager_secret.datadog_api_token[0].arn : null
@@ -46,3 +49,36 @@ resource "aws_lambda_permission" "api_gateway_permission" {
 
   source_arn = "${aws_api_gateway_rest_api.gateway.execution_arn}/*"
 }
+
+resource "aws_lambda_function" "github_app_event_consumer" {
+  count         = local.events_queue_enabled ? 1 : 0
+  function_name = "${var.project_name}-events-consumer"
+  role          = aws_iam_role.lambda_execution_role.arn
+  architectures = ["arm64"]
+  runtime       = "python3.11"
+  handler       = "secrets_finder.process_queued_events"
+  timeout       = local.events_consumer_timeout
+
+  filename         = var.lambda_archive_file_path
+  source_code_hash = filebase64sha256(var.lambda_archive_file_path)
+
+  environment {
+    variables = {
+      SECRETS_FINDER_GITHUB_TOKEN_REFERENCE      = var.github_token_reference
+      SECRETS_FINDER_GITHUB_APP_SECRET_REFERENCE = var.github_app_secret_reference
+      GITHUB_ORGANIZATION                        = var.github_secret_prevention_workflow_org
+      GITHUB_REPOSITORY                          = var.github_secret_prevention_workflow_repository
+      SECRETS_FINDER_SECRETS_CACHE_TTL           = var.secrets_cache_ttl
+      SECRETS_FINDER_PENDING_EVENTS_TABLE        = local.event_coalescing_enabled ? aws_dynamodb_table.pending_events[0].name : null
+    }
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "events" {
+  count            = local.events_queue_enabled ? 1 : 0
+  event_source_arn = aws_sqs_queue.events[0].arn
+  function_name    = aws_lambda_function.github_app_event_consumer[0].arn
+  batch_size       = 10
+
+  function_response_types = ["ReportBatchItemFailures"]
+}
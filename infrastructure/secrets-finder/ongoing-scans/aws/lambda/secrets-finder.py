@@ -4,19 +4,82 @@ import hmac
 import json
 import os
 import requests
-
+import threading
+import time
+import uuid
 
 HTTP_MAX_RETRIES = 5
 HTTP_BACKOFF_FACTOR = 0.1
 HTTP_STATUSES_ELIGIBLE_FOR_RETRY = [429, 500, 502, 503, 504]
+SECRETS_CACHE_TTL = int(os.environ.get("SECRETS_FINDER_SECRETS_CACHE_TTL", 300))
+SECRETS_CACHE_MIN_REFRESH_INTERVAL = 30
+EVENTS_QUEUE_URL = os.environ.get("SECRETS_FINDER_EVENTS_QUEUE_URL")
+PENDING_EVENTS_TABLE = os.environ.get("SECRETS_FINDER_PENDING_EVENTS_TABLE")
+PENDING_EVENTS_TTL = 86400
+PENDING_EVENTS_MAX_ATTEMPTS = 5
 
 
 secrets_manager = boto3.client("secretsmanager")
+sqs = boto3.client("sqs")
+dynamodb = boto3.client("dynamodb")
+
+
+class SecretsCache:
+    """
+    Caches secrets retrieved from Secrets Manager for the lifetime of the execution environment.
+
+    Secrets are fetched again once their TTL has expired, or when a caller notices that a cached
+    value has been rotated (signature mismatch, authentication failure) and asks for a refresh.
+    Refreshes can be triggered by unauthenticated requests, so they are ignored for secrets fetched
+    less than min_refresh_interval seconds ago.
+    """
+
+    def __init__(
+        self, client, ttl, min_refresh_interval=SECRETS_CACHE_MIN_REFRESH_INTERVAL
+    ):
+        self.client = client
+        self.ttl = ttl
+        self.min_refresh_interval = min_refresh_interval
+        self.secrets = {}
+        self.lock = threading.Lock()
+
+    def get(self, secret_id, refresh=False):
+        with self.lock:
+            now = time.monotonic()
+            cached = self.secrets.get(secret_id)
+            if cached and now < cached[1] + self.ttl:
+                if not refresh or now < cached[1] + self.min_refresh_interval:
+                    return cached[0]
+
+            value = self.client.get_secret_value(SecretId=secret_id)["SecretString"]
+            self.secrets[secret_id] = (value, now)
+            return value
+
+
+secrets_cache = SecretsCache(secrets_manager, SECRETS_CACHE_TTL)
+
+
+def create_requests_session():
+    session = requests.Session()
+    retry_strategy = requests.adapters.Retry(
+        total=HTTP_MAX_RETRIES,
+        backoff_factor=HTTP_BACKOFF_FACTOR,
+        status_forcelist=HTTP_STATUSES_ELIGIBLE_FOR_RETRY,
+    )
+    session.mount("https://", requests.adapters.HTTPAdapter(max_retries=retry_strategy))
+    return session
+
+
+# The session is reused across invocations, so warm execution environments keep their connections
+requests_session = create_requests_session()
 
 
 def handler(event, _):
     validate_request(event)
-    status_code = forward_request(event)
+    if EVENTS_QUEUE_URL:
+        status_code = enqueue_request(event)
+    else:
+        status_code = forward_request(event)
     return {"statusCode": status_code}
 
 
@@ -31,12 +94,13 @@ def validate_request(event):
     github_app_secret_reference = os.environ[
         "SECRETS_FINDER_GITHUB_APP_SECRET_REFERENCE"
     ]
-    github_app_secret = secrets_manager.get_secret_value(
-        SecretId=github_app_secret_reference
-    )["SecretString"]
+    github_app_secret = secrets_cache.get(github_app_secret_reference)
 
     if not verify_signature(github_app_secret, signature, event["body"]):
-        raise Exception("Unauthorized")
+        # The secret may have been rotated since it was cached
+        github_app_secret = secrets_cache.get(github_app_secret_reference, refresh=True)
+        if not verify_signature(github_app_secret, signature, event["body"]):
+            raise Exception("Unauthorized")
 
 
 def verify_signature(secret, signature, payload):
@@ -47,9 +111,7 @@ def verify_signature(secret, signature, payload):
     return hmac.compare_digest(expected_signature, signature)
 
 
-def forward_request(event):
-    payload = json.loads(event["body"])
-
+def format_event(payload):
     if "commits" in payload and "ref" in payload:
         if (
             payload.get("ref")
@@ -81,7 +143,7 @@ def forward_request(event):
                 },
             }
         else:
-            return {"statusCode": 204}
+            return None
 
     elif "pull_request" in payload and "action" in payload:
         if payload.get("action") in ["opened", "synchronize", "reopened"]:
@@ -104,15 +166,23 @@ def forward_request(event):
                 },
             }
         else:
-            return {"statusCode": 204}
+            return None
     else:
         raise ValueError("Unrecognized request. Operation canceled.")
 
-    github_token_reference = os.environ["SECRETS_FINDER_GITHUB_TOKEN_REFERENCE"]
-    github_token = secrets_manager.get_secret_value(SecretId=github_token_reference)[
-        "SecretString"
-    ]
+    return event_type, formatted_event
+
+
+def forward_request(event):
+    formatted = format_event(json.loads(event["body"]))
+    if formatted is None:
+        return 204
+
+    return send_repository_dispatch(*formatted)
+
 
+def send_repository_dispatch(event_type, formatted_event):
+    github_token_reference = os.environ["SECRETS_FINDER_GITHUB_TOKEN_REFERENCE"]
     organization = os.getenv("GITHUB_ORGANIZATION")
     repository = os.getenv("GITHUB_REPOSITORY")
     url = f"https://api.github.com/repos/{organization}/{repository}/dispatches"
@@ -122,21 +192,224 @@ def forward_request(event):
         "client_payload": {"event": formatted_event},
     }
 
+    data = json.dumps(formatted_payload).encode("utf-8")
+
+    response = dispatch_event(url, data, secrets_cache.get(github_token_reference))
+    if response.status_code == 401:
+        # The token may have been rotated since it was cached
+        response = dispatch_event(
+            url, data, secrets_cache.get(github_token_reference, refresh=True)
+        )
+    return response.status_code
+
+
+def dispatch_event(url, data, github_token):
     headers = {
         "Accept": "application/vnd.github.everest-preview+json",
         "Authorization": f"Bearer {github_token}",
     }
+    return requests_session.post(url, data=data, headers=headers)
 
-    requests_session = requests.Session()
-    requests_retry_strategy = requests.adapters.Retry(
-        total=HTTP_MAX_RETRIES,
-        backoff_factor=HTTP_BACKOFF_FACTOR,
-        status_forcelist=HTTP_STATUSES_ELIGIBLE_FOR_RETRY,
+
+def get_coalescing_key(event_type, formatted_event):
+    repository = formatted_event["repository"]["full_name"]
+    if event_type == "secrets_detection_in_pull_request":
+        return f"{repository}#pull/{formatted_event['pull_request']['number']}"
+    return f"{repository}#{formatted_event['ref']}"
+
+
+def enqueue_request(event):
+    formatted = format_event(json.loads(event["body"]))
+    if formatted is None:
+        return 204
+
+    event_type, formatted_event = formatted
+    key = get_coalescing_key(event_type, formatted_event)
+    delivery = (
+        event["headers"].get("X-GitHub-Delivery")
+        or hashlib.sha256(event["body"].encode("utf-8")).hexdigest()
     )
-    requests_session.mount(
-        "https://", requests.adapters.HTTPAdapter(max_retries=requests_retry_strategy)
+
+    if PENDING_EVENTS_TABLE:
+        # The message only references the pending event, which is dispatched when the message is
+        # received after the coalescing window if no newer event has been merged into it since
+        message = {"key": key, "version": store_pending_event(key, *formatted)}
+    else:
+        message = {"event_type": event_type, "event": formatted_event}
+
+    # Events of the same repository and branch (or pull request) share a message group, so they
+    # are received in order and can be merged by the consumer
+    sqs.send_message(
+        QueueUrl=EVENTS_QUEUE_URL,
+        MessageBody=json.dumps(message),
+        MessageGroupId=hashlib.sha256(key.encode("utf-8")).hexdigest(),
+        # Messages referencing a pending event are deduplicated on its version, so that the message
+        # of the latest version is never dropped, even for an event delivered again by GitHub
+        MessageDeduplicationId=message.get("version", delivery),
     )
-    response = requests_session.post(
-        url, data=json.dumps(formatted_payload).encode("utf-8"), headers=headers
+    return 202
+
+
+def coalesce_events(events):
+    """
+    Merges events received for the same repository and branch, or the same pull request.
+
+    Consecutive pushes are merged into a single event covering all their commits, from the
+    'before' commit of the first push to the 'after' commit of the last one. For pull requests,
+    only the most recent event is kept, as each run scans the whole branch of the pull request.
+    """
+    coalesced = {}
+    for event_type, formatted_event in events:
+        key = get_coalescing_key(event_type, formatted_event)
+        previous = coalesced.get(key)
+        if previous is None or event_type == "secrets_detection_in_pull_request":
+            coalesced[key] = (event_type, formatted_event)
+            continue
+
+        merged = previous[1]
+        known_commits = {commit["id"] for commit in merged["commits"]}
+        merged["commits"].extend(
+            commit
+            for commit in formatted_event["commits"]
+            if commit["id"] not in known_commits
+        )
+        merged["after"] = formatted_event["after"]
+        merged["pusher"] = formatted_event["pusher"]
+
+    return list(coalesced.values())
+
+
+def store_pending_event(key, event_type, formatted_event):
+    """
+    Merges an event into the pending event stored for its coalescing key, and returns the new
+    version of the pending event.
+
+    Pending events are updated with optimistic locking on their version, so that events received
+    concurrently for the same key are all merged.
+    """
+    for _ in range(PENDING_EVENTS_MAX_ATTEMPTS):
+        item = dynamodb.get_item(
+            TableName=PENDING_EVENTS_TABLE,
+            Key={"coalescing_key": {"S": key}},
+            ConsistentRead=True,
+        ).get("Item")
+
+        merged_event = (event_type, formatted_event)
+        if item:
+            pending = json.loads(item["event"]["S"])
+            merged_event = coalesce_events(
+                [(pending["event_type"], pending["event"]), merged_event]
+            )[0]
+
+        version = str(uuid.uuid4())
+        if item:
+            condition = {
+                "ConditionExpression": "#version = :version",
+                "ExpressionAttributeNames": {"#version": "version"},
+                "ExpressionAttributeValues": {":version": item["version"]},
+            }
+        else:
+            condition = {
+                "ConditionExpression": "attribute_not_exists(coalescing_key)",
+            }
+
+        try:
+            dynamodb.put_item(
+                TableName=PENDING_EVENTS_TABLE,
+                Item={
+                    "coalescing_key": {"S": key},
+                    "version": {"S": version},
+                    "event": {
+                        "S": json.dumps(
+                            {"event_type": merged_event[0], "event": merged_event[1]}
+                        )
+                    },
+                    "expires_on": {"N": str(int(time.time()) + PENDING_EVENTS_TTL)},
+                },
+                **condition,
+            )
+            return version
+        except dynamodb.exceptions.ConditionalCheckFailedException:
+            continue
+
+    raise Exception(
+        f"Unable to store pending event ({key}): too many concurrent updates"
     )
-    return response.status_code
+
+
+def get_pending_event(key, version):
+    """
+    Returns the pending event stored for a coalescing key, or None if it has been updated by a
+    newer event (whose own message dispatches it later) or already dispatched.
+    """
+    item = dynamodb.get_item(
+        TableName=PENDING_EVENTS_TABLE,
+        Key={"coalescing_key": {"S": key}},
+        ConsistentRead=True,
+    ).get("Item")
+    if not item or item["version"]["S"] != version:
+        return None
+
+    pending = json.loads(item["event"]["S"])
+    return pending["event_type"], pending["event"]
+
+
+def delete_pending_event(key, version):
+    # Events merged while the pending event was being dispatched are kept for their own message
+    try:
+        dynamodb.delete_item(
+            TableName=PENDING_EVENTS_TABLE,
+            Key={"coalescing_key": {"S": key}},
+            ConditionExpression="#version = :version",
+            ExpressionAttributeNames={"#version": "version"},
+            ExpressionAttributeValues={":version": {"S": version}},
+        )
+    except dynamodb.exceptions.ConditionalCheckFailedException:
+        pass
+
+
+def process_queued_events(event, _):
+    """
+    Dispatches events received from the events queue, after coalescing them.
+
+    When events are debounced, messages reference a pending event, which is only dispatched if no
+    newer event has been merged into it during the coalescing window. Otherwise, events received in
+    the same batch are merged. Messages of events which could not be dispatched are reported as
+    failed, so that they are received again and moved to the dead-letter queue after the
+    configured number of attempts.
+    """
+    events = []
+    message_identifiers = {}
+    pending_versions = {}
+    for record in event["Records"]:
+        message = json.loads(record["body"])
+        if "version" in message:
+            pending_event = get_pending_event(message["key"], message["version"])
+            if pending_event is None:
+                continue
+            events.append(pending_event)
+            pending_versions[message["key"]] = message["version"]
+        else:
+            events.append((message["event_type"], message["event"]))
+        key = get_coalescing_key(*events[-1])
+        message_identifiers.setdefault(key, []).append(record["messageId"])
+
+    coalesced_events = coalesce_events(events)
+    print(f"{len(events)} event(s) coalesced into {len(coalesced_events)} dispatch(es)")
+
+    failures = []
+    for event_type, formatted_event in coalesced_events:
+        key = get_coalescing_key(event_type, formatted_event)
+        try:
+            status_code = send_repository_dispatch(event_type, formatted_event)
+            if status_code >= 300:
+                raise Exception(f"Unexpected status code: {status_code}")
+            if key in pending_versions:
+                delete_pending_event(key, pending_versions[key])
+        except Exception as e:
+            print(f"Unable to dispatch event ({key}): {e}")
+            failures.extend(message_identifiers[key])
+
+    return {
+        "batchItemFailures": [{"itemIdentifier": identifier} for identifier in failures]
+    }
@@ -1,4 +1,8 @@
 locals {
   environment = replace(lower(var.environment_type), " ", "-")
   tags        = merge(try(var.tags, {}), { environment = local.environment })
+
+  event_coalescing_enabled = var.event_coalescing_window != null
+  events_queue_enabled     = var.asynchronous_processing || local.event_coalescing_enabled
+  events_consumer_timeout  = 60
 }
@@ -14,6 +14,18 @@ output "lambda_function" {
   value = aws_lambda_function.github_app_event_handler.arn
 }
 
+output "events_queue" {
+  value = local.events_queue_enabled ? aws_sqs_queue.events[0].arn : null
+}
+
+output "pending_events_table" {
+  value = local.event_coalescing_enabled ? aws_dynamodb_table.pending_events[0].arn : null
+}
+
+output "events_dead_letter_queue" {
+  value = local.events_queue_enabled ? aws_sqs_queue.events_dead_letter[0].arn : null
+}
+
 output "cloudfront_distribution" {
   value = aws_cloudfront_distribution.distribution.domain_name
 }
@@ -0,0 +1,26 @@
+# Each message is received after the coalescing window, and only dispatches its pending event if no
+# newer event has been merged into it in the meantime. The visibility timeout is six times the
+# timeout of the consumer, as recommended by AWS, so that batches being retried or throttled are not
+# received again while they are still being processed.
+resource "aws_sqs_queue" "events" {
+  count                      = local.events_queue_enabled ? 1 : 0
+  name                       = "${var.project_name}-events.fifo"
+  fifo_queue                 = true
+  delay_seconds              = var.event_coalescing_window != null ? var.event_coalescing_window : 0
+  visibility_timeout_seconds = 6 * local.events_consumer_timeout
+  message_retention_seconds  = 86400
+  sqs_managed_sse_enabled    = true
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.events_dead_letter[0].arn
+    maxReceiveCount     = var.event_dispatch_max_attempts
+  })
+}
+
+resource "aws_sqs_queue" "events_dead_letter" {
+  count                     = local.events_queue_enabled ? 1 : 0
+  name                      = "${var.project_name}-events-dead-letter.fifo"
+  fifo_queue                = true
+  message_retention_seconds = 1209600
+  sqs_managed_sse_enabled   = true
+}
@@ -228,3 +228,42 @@ variable "datadog_service_name" {
     error_message = "The provided service name is invalid"
   }
 }
+
+variable "secrets_cache_ttl" {
+  type        = number
+  default     = 300
+  description = "Number of seconds during which the Lambda function reuses secrets retrieved from Secrets Manager (secrets are retrieved again earlier when a rotation is detected)"
+
+  validation {
+    condition     = var.secrets_cache_ttl >= 0
+    error_message = "secrets_cache_ttl must be greater than or equal to 0"
+  }
+}
+
+variable "event_coalescing_window" {
+  type        = number
+  default     = null
+  description = "Number of seconds without new events after which the events received for a branch or a pull request are dispatched. Events are merged into a pending event stored in DynamoDB, so that consecutive pushes to the same branch and updates of the same pull request received less than this number of seconds apart trigger a single workflow run. Leave empty to disable coalescing."
+
+  validation {
+    condition     = var.event_coalescing_window == null || (var.event_coalescing_window >= 0 && var.event_coalescing_window <= 900)
+    error_message = "event_coalescing_window must be between 0 and 900 seconds"
+  }
+}
+
+variable "asynchronous_processing" {
+  type        = bool
+  default     = false
+  description = "Whether to acknowledge webhook events as soon as they are validated and queued, and dispatch them from a separate function (enabled automatically when 'event_coalescing_window' is set)"
+}
+
+variable "event_dispatch_max_attempts" {
+  type        = number
+  default     = 5
+  description = "Number of attempts to dispatch a queued event before it is moved to the dead-letter queue"
+
+  validation {
+    condition     = var.event_dispatch_max_attempts >= 1 && var.event_dispatch_max_attempts <= 1000
+    error_message = "event_dispatch_max_attempts must be between 1 and 1000"
+  }
+}
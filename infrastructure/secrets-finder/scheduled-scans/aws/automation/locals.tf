@@ -31,7 +31,8 @@ locals {
     "${local.configuration_folder}/scanner/git-credentials-helper.sh",
     "${local.configuration_folder}/scanner/scan-configuration.schema.json",
     "${local.configuration_folder}/scanner/scanner.py",
-    "${local.configuration_folder}/scanner/scanner.requirements.txt"
+    "${local.configuration_folder}/scanner/scanner.requirements.txt",
+    "${local.configuration_folder}/scanner/verification-cache.requirements.txt"
   ]
 
   backend_static_files = [
@@ -52,10 +53,14 @@ locals {
         scan      = s
         reference = f
         formatted_file = templatefile(f, merge(local.setup_variables, {
-          scm                   = s.scm
-          scan_identifier       = s.identifier
-          credentials_reference = s.credentials_reference
-          report_only_verified  = s.report_only_verified != null ? s.report_only_verified : false
+          scm                       = s.scm
+          scan_identifier           = s.identifier
+          credentials_reference     = s.credentials_reference
+          report_only_verified      = s.report_only_verified != null ? s.report_only_verified : false
+          user_scripts_concurrency  = s.user_scripts_concurrency != null ? s.user_scripts_concurrency : 1
+          log_shipping              = s.log_shipping != null ? s.log_shipping : "none"
+          deduplicate_fork_networks = s.deduplicate_fork_networks != null ? s.deduplicate_fork_networks : false
+          verification_cache_ttl    = s.verification_cache_ttl != null ? s.verification_cache_ttl : 0
         }))
       }
     ]
@@ -78,6 +83,10 @@ locals {
           terminate_instance_on_error   = s.terminate_instance_on_error != null ? s.terminate_instance_on_error : ""
           terminate_instance_after_scan = s.terminate_instance_after_scan != null ? s.terminate_instance_after_scan : ""
           report_only_verified          = s.report_only_verified != null ? s.report_only_verified : false
+          artifacts_compression         = s.artifacts_compression != null ? s.artifacts_compression : ""
+          seed_trufflehog_cache         = s.seed_trufflehog_cache != null ? s.seed_trufflehog_cache : ""
+          trufflehog_archive_sha256     = s.trufflehog_archive_sha256 != null ? s.trufflehog_archive_sha256 : ""
+          export_parquet                = s.export_parquet != null ? s.export_parquet : ""
         }))
       }
     ]
@@ -198,6 +198,14 @@ variable "scans" {
     terminate_instance_on_error   = optional(bool)
     terminate_instance_after_scan = optional(bool)
     report_only_verified          = optional(bool)
+    artifacts_compression         = optional(string)
+    seed_trufflehog_cache         = optional(bool)
+    trufflehog_archive_sha256     = optional(string)
+    user_scripts_concurrency      = optional(number)
+    log_shipping                  = optional(string)
+    deduplicate_fork_networks     = optional(bool)
+    verification_cache_ttl        = optional(number)
+    export_parquet                = optional(bool)
   }))
 
   validation {
@@ -250,6 +258,51 @@ variable "scans" {
     error_message = "When set, repositories_to_scan should reference an existing file on the local system."
   }
 
+  validation {
+    condition = (
+      alltrue([
+        for scan in var.scans : scan.artifacts_compression == null ? true : contains(["none", "gzip", "zstd"], scan.artifacts_compression)
+      ])
+    )
+    error_message = "When set, the artifacts_compression field must be one of 'none', 'gzip', 'zstd'."
+  }
+
+  validation {
+    condition = (
+      alltrue([
+        for scan in var.scans : scan.user_scripts_concurrency == null ? true : (scan.user_scripts_concurrency >= 1 && floor(scan.user_scripts_concurrency) == scan.user_scripts_concurrency)
+      ])
+    )
+    error_message = "When set, the user_scripts_concurrency field must be an integer greater than or equal to 1."
+  }
+
+  validation {
+    condition = (
+      alltrue([
+        for scan in var.scans : scan.verification_cache_ttl == null ? true : (scan.verification_cache_ttl >= 0 && floor(scan.verification_cache_ttl) == scan.verification_cache_ttl)
+      ])
+    )
+    error_message = "When set, the verification_cache_ttl field must be an integer greater than or equal to 0."
+  }
+
+  validation {
+    condition = (
+      alltrue([
+        for scan in var.scans : scan.trufflehog_archive_sha256 == null ? true : can(regex("^[0-9a-fA-F]{64}$", scan.trufflehog_archive_sha256))
+      ])
+    )
+    error_message = "When set, the trufflehog_archive_sha256 field must be a SHA-256 checksum (64 hexadecimal characters)."
+  }
+
+  validation {
+    condition = (
+      alltrue([
+        for scan in var.scans : scan.log_shipping == null ? true : contains(["none", "datadog", "s3"], scan.log_shipping)
+      ])
+    )
+    error_message = "When set, the log_shipping field must be one of 'none', 'datadog', 's3'."
+  }
+
   validation {
     condition = (
       alltrue([
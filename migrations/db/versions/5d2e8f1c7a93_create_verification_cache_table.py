@@ -0,0 +1,33 @@
+"""create verification cache table
+
+Revision ID: 5d2e8f1c7a93
+Revises: db4e0564e6df
+Create Date: 2026-10-19 13:40:12.518306
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "5d2e8f1c7a93"
+down_revision: Union[str, None] = "db4e0564e6df"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "verification_cache",
+        sa.Column("key", sa.String(), primary_key=True),
+        sa.Column("detector_name", sa.String(), nullable=False),
+        sa.Column("verified", sa.Boolean(), nullable=False),
+        sa.Column("verified_on", sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("verification_cache")
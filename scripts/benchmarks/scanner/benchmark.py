@@ -0,0 +1,508 @@
+import argparse
+import datetime
+import json
+import os
+import random
+import resource
+import shutil
+import socket
+import string
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+
+BENCHMARK_FOLDER = os.path.dirname(os.path.abspath(__file__))
+SECRETS_FINDER_FOLDER = os.path.join(
+    BENCHMARK_FOLDER, "..", "..", "..", "configuration", "secrets-finder"
+)
+SCANNER_FILES = [
+    os.path.join(SECRETS_FINDER_FOLDER, "common.py"),
+    os.path.join(SECRETS_FINDER_FOLDER, "scanner", "scanner.py"),
+    os.path.join(SECRETS_FINDER_FOLDER, "scanner", "scan-configuration.schema.json"),
+]
+ORGANIZATION = "benchmark"
+WORDS = [
+    "alpha",
+    "bravo",
+    "charlie",
+    "delta",
+    "echo",
+    "foxtrot",
+    "golf",
+    "hotel",
+    "india",
+    "juliett",
+    "kilo",
+    "lima",
+]
+
+# Log messages of the scanner starting a phase; a phase ends when another one starts for the same
+# repository, or with one of the PHASE_END_MESSAGES
+PHASE_START_MESSAGES = {
+    "Cloning repository:": "clone",
+    "Fetching changes of repository:": "clone",
+    "Scanning command to execute:": "scan",
+    "Verification cache hits:": "verification",
+    "Deleting local repository:": "cleanup",
+    "Saving scan results for repository:": "results",
+}
+PHASE_END_MESSAGES = [
+    "Repository cloned:",
+    "Changes of repository fetched:",
+    "Local repository deleted:",
+    "Number of secrets found in repository",
+]
+
+
+def configure_parser():
+    parser = argparse.ArgumentParser(
+        prog="secrets-finder-scanner-benchmark",
+        description="This script benchmarks the scanner end to end on synthetic git repositories.",
+        epilog="Arguments given after '--' are passed to the scanner (for example: -- --deduplicate-fork-networks).",
+    )
+
+    parser.add_argument(
+        "--repositories", help="the number of repositories", type=int, default=20
+    )
+    parser.add_argument(
+        "--forks",
+        help="the number of forks created for each repository, with their own additional commits",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--commits", help="the number of commits per repository", type=int, default=100
+    )
+    parser.add_argument(
+        "--files-per-commit",
+        help="the number of files modified by each commit",
+        type=int,
+        default=3,
+    )
+    parser.add_argument(
+        "--lines-per-file", help="the number of lines per file", type=int, default=50
+    )
+    parser.add_argument(
+        "--secret-density",
+        help="the probability for a commit to add a secret",
+        type=float,
+        default=0.05,
+    )
+    parser.add_argument(
+        "--seed", help="the seed used to generate repositories", type=int, default=0
+    )
+    parser.add_argument(
+        "--transport",
+        help="how repositories are served to the scanner",
+        choices=["file", "git-daemon"],
+        default="file",
+    )
+    parser.add_argument(
+        "--trufflehog",
+        help="the TruffleHog binary to use, or 'fake' to use the fake emitter",
+        default="fake",
+    )
+    parser.add_argument(
+        "--fake-startup-latency",
+        help="seconds waited by the fake emitter before scanning",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--fake-commit-latency",
+        help="seconds waited by the fake emitter per commit scanned",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--fake-verification-latency",
+        help="seconds waited by the fake emitter per secret verified",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--fake-output-multiplier",
+        help="number of times the fake emitter reports each finding",
+        type=int,
+        default=1,
+    )
+    parser.add_argument(
+        "--fake-log-lines",
+        help="number of log lines written by the fake emitter per commit",
+        type=int,
+        default=0,
+    )
+    parser.add_argument(
+        "--fake-verified-ratio",
+        help="share of secrets reported as verified by the fake emitter",
+        type=float,
+        default=0,
+    )
+    parser.add_argument(
+        "--work-folder",
+        help="the folder where repositories are generated and the scanner is run (kept after the benchmark, and repositories are reused when generated with the same parameters)",
+    )
+    parser.add_argument("--output", help="the file where the report is saved as JSON")
+
+    arguments, scanner_arguments = parser.parse_known_args()
+    arguments.scanner_arguments = [a for a in scanner_arguments if a != "--"]
+    return arguments
+
+
+def get_random_content(rng, lines, with_secret):
+    content = [
+        " ".join(rng.choice(WORDS) for _ in range(8)) + "\n" for _ in range(lines)
+    ]
+    if with_secret:
+        secret = "AKIA" + "".join(
+            rng.choice(string.ascii_uppercase + string.digits) for _ in range(16)
+        )
+        content[rng.randrange(lines)] = f'aws_access_key_id = "{secret}"\n'
+    return "".join(content).encode()
+
+
+def write_commits(repository, arguments, rng, commits, parent=None):
+    """
+    Adds commits on the main branch of a repository with git fast-import.
+
+    Returns the number of secrets added.
+    """
+    process = subprocess.Popen(
+        ["git", "-C", repository, "fast-import", "--quiet"], stdin=subprocess.PIPE
+    )
+    pool = max(arguments.files_per_commit * 4, 10)
+    timestamp = 1700000000
+    secrets = 0
+
+    for index in range(1, commits + 1):
+        message = f"Commit {index}".encode()
+        commands = [
+            b"commit refs/heads/main\n",
+            f"mark :{index}\n".encode(),
+            f"committer Benchmark <benchmark@example.com> {timestamp + index * 60} +0000\n".encode(),
+            f"data {len(message)}\n".encode() + message + b"\n",
+        ]
+        if index > 1:
+            commands.append(f"from :{index - 1}\n".encode())
+        elif parent:
+            commands.append(f"from {parent}\n".encode())
+
+        with_secret = rng.random() < arguments.secret_density
+        secrets += with_secret
+        files = rng.sample(range(pool), arguments.files_per_commit)
+        for file_index in files:
+            content = get_random_content(
+                rng, arguments.lines_per_file, with_secret and file_index == files[0]
+            )
+            commands.append(f"M 100644 inline src/module_{file_index}.txt\n".encode())
+            commands.append(f"data {len(content)}\n".encode() + content + b"\n")
+        process.stdin.write(b"".join(commands))
+
+    process.stdin.close()
+    if process.wait() != 0:
+        raise Exception(f"Unable to generate commits in repository: {repository}")
+    return secrets
+
+
+def generate_repositories(arguments, folder):
+    parameters = {
+        key: getattr(arguments, key)
+        for key in [
+            "repositories",
+            "forks",
+            "commits",
+            "files_per_commit",
+            "lines_per_file",
+            "secret_density",
+            "seed",
+        ]
+    }
+    parameters_file = os.path.join(folder, "parameters.json")
+    if os.path.isfile(parameters_file):
+        with open(parameters_file, "r") as file:
+            if json.load(file) == parameters:
+                print(f"Reusing repositories generated in: {folder}")
+                return sorted(os.listdir(os.path.join(folder, ORGANIZATION)))
+        shutil.rmtree(folder)
+
+    rng = random.Random(arguments.seed)
+    organization_folder = os.path.join(folder, ORGANIZATION)
+    os.makedirs(organization_folder)
+    names = []
+    secrets = 0
+    start = time.monotonic()
+
+    for index in range(arguments.repositories):
+        name = f"repository-{index}"
+        repository = os.path.join(organization_folder, name)
+        subprocess.run(
+            ["git", "init", "-q", "--bare", "-b", "main", repository], check=True
+        )
+        secrets += write_commits(repository, arguments, rng, arguments.commits)
+        names.append(name)
+
+        parent = subprocess.run(
+            ["git", "-C", repository, "rev-parse", "main"],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.strip()
+        for fork_index in range(arguments.forks):
+            fork_name = f"{name}-fork-{fork_index}"
+            fork = os.path.join(organization_folder, fork_name)
+            subprocess.run(
+                ["git", "clone", "-q", "--bare", repository, fork], check=True
+            )
+            secrets += write_commits(
+                fork, arguments, rng, max(arguments.commits // 10, 1), parent
+            )
+            names.append(fork_name)
+
+    with open(parameters_file, "w") as file:
+        json.dump(parameters, file)
+
+    print(
+        f"{len(names)} repositories generated with {secrets} secrets in {time.monotonic() - start:.1f}s: {folder}"
+    )
+    return sorted(names)
+
+
+def get_free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_git_daemon(folder, repository):
+    port = get_free_port()
+    process = subprocess.Popen(
+        [
+            "git",
+            "daemon",
+            "--reuseaddr",
+            "--export-all",
+            "--listen=127.0.0.1",
+            f"--port={port}",
+            f"--base-path={folder}",
+            folder,
+        ]
+    )
+    # The daemon is ready once a repository can be listed through it
+    for _ in range(50):
+        if (
+            subprocess.run(
+                ["git", "ls-remote", f"git://127.0.0.1:{port}/{repository}"],
+                stdout=subprocess.DEVNULL,
+                stderr=subprocess.DEVNULL,
+            ).returncode
+            == 0
+        ):
+            return process, f"git://127.0.0.1:{port}/{{organization}}/{{repository}}"
+        time.sleep(0.1)
+    process.terminate()
+    raise Exception("Unable to start git daemon")
+
+
+def get_peak_rss(pid):
+    try:
+        with open(f"/proc/{pid}/status", "r") as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return None
+
+
+def run_scanner(arguments, scanner_folder, scan_folder, endpoint, names):
+    for file in SCANNER_FILES:
+        shutil.copy(file, scanner_folder)
+    with open(os.path.join(scanner_folder, "repositories_to_scan.json"), "w") as file:
+        json.dump(
+            {
+                "scm": "custom",
+                "endpoint": endpoint,
+                "repositories": [
+                    {"organization": ORGANIZATION, "name": name} for name in names
+                ],
+            },
+            file,
+        )
+
+    if arguments.trufflehog == "fake":
+        trufflehog = os.path.join(BENCHMARK_FOLDER, "fake_trufflehog.py")
+    else:
+        trufflehog = os.path.abspath(arguments.trufflehog)
+
+    scan_uuid = str(uuid.uuid4())
+    environment = {
+        **os.environ,
+        "SECRETS_FINDER_SCAN_USERNAME": "benchmark",
+        "SECRETS_FINDER_SCAN_TOKEN": "benchmark",
+        "FAKE_TRUFFLEHOG_STARTUP_LATENCY": str(arguments.fake_startup_latency),
+        "FAKE_TRUFFLEHOG_COMMIT_LATENCY": str(arguments.fake_commit_latency),
+        "FAKE_TRUFFLEHOG_VERIFICATION_LATENCY": str(
+            arguments.fake_verification_latency
+        ),
+        "FAKE_TRUFFLEHOG_OUTPUT_MULTIPLIER": str(arguments.fake_output_multiplier),
+        "FAKE_TRUFFLEHOG_LOG_LINES": str(arguments.fake_log_lines),
+        "FAKE_TRUFFLEHOG_VERIFIED_RATIO": str(arguments.fake_verified_ratio),
+    }
+    command = [
+        sys.executable,
+        os.path.join(scanner_folder, "scanner.py"),
+        "--debug",
+        "--scm=custom",
+        "--scan-identifier=benchmark",
+        f"--scan-uuid={scan_uuid}",
+        f"--scan-folder={scan_folder}",
+        f"--scanner-folder={scanner_folder}",
+        f"--trufflehog-installation-path={os.path.dirname(trufflehog)}",
+        f"--trufflehog-executable-name={os.path.basename(trufflehog)}",
+        *arguments.scanner_arguments,
+    ]
+
+    # Peak RSS is read from /proc while the scanner runs, and from rusage otherwise
+    peak_rss = 0
+    start = time.monotonic()
+    process = subprocess.Popen(command, env=environment)
+    while process.poll() is None:
+        peak_rss = max(peak_rss, get_peak_rss(process.pid) or 0)
+        time.sleep(0.05)
+    duration = time.monotonic() - start
+    if not peak_rss:
+        peak_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss * 1024
+
+    if process.returncode != 0:
+        raise Exception(f"Scanner exited with code {process.returncode}")
+
+    with open(os.path.join(scanner_folder, f"{scan_uuid}.json"), "r") as file:
+        results = json.load(file)
+
+    return duration, peak_rss, results
+
+
+def get_phase_timings(log_file):
+    executions = {}
+    with open(log_file, "r") as file:
+        for line in file:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if record.get("context", "").startswith("SECRETS-FINDER ("):
+                executions.setdefault(record["context"], []).append(record)
+
+    timings = {}
+    for records in executions.values():
+        current = None
+        for record in records:
+            time_ = datetime.datetime.strptime(record["time"], "%Y-%m-%d %H:%M:%S.%f")
+            message = record.get("message", "")
+            phase = next(
+                (p for m, p in PHASE_START_MESSAGES.items() if message.startswith(m)),
+                None,
+            )
+            if current and phase == current[0]:
+                # Some messages starting a phase are logged more than once by the scanner
+                continue
+            ends = phase or any(message.startswith(m) for m in PHASE_END_MESSAGES)
+            if current and ends:
+                timings.setdefault(current[0], []).append(
+                    (time_ - current[1]).total_seconds()
+                )
+                current = None
+            if phase:
+                current = (phase, time_)
+
+    return {
+        phase: {
+            "count": len(durations),
+            "total": sum(durations),
+            "mean": sum(durations) / len(durations),
+            "max": max(durations),
+        }
+        for phase, durations in timings.items()
+    }
+
+
+def print_report(report):
+    print()
+    print(
+        f"Repositories scanned:   {report['repositories']} ({report['failures']} failed)"
+    )
+    print(f"Findings:               {report['findings']}")
+    print(f"Duration:               {report['duration']:.2f}s")
+    print(
+        f"Throughput:             {report['repositories_per_minute']:.1f} repositories/min"
+    )
+    print(f"Scanner peak RSS:       {report['peak_rss'] / 1024 / 1024:.1f} MiB")
+    print()
+    print(f"{'Phase':<14}{'Count':>8}{'Total (s)':>12}{'Mean (s)':>12}{'Max (s)':>12}")
+    for phase, timing in report["phases"].items():
+        print(
+            f"{phase:<14}{timing['count']:>8}{timing['total']:>12.3f}{timing['mean']:>12.3f}{timing['max']:>12.3f}"
+        )
+
+
+def main():
+    arguments = configure_parser()
+    work_folder = arguments.work_folder or tempfile.mkdtemp(prefix="benchmark-")
+    repositories_folder = os.path.join(work_folder, "repositories")
+    scanner_folder = os.path.join(work_folder, "scanner")
+    scan_folder = os.path.join(work_folder, "scan")
+    daemon = None
+
+    try:
+        names = generate_repositories(arguments, repositories_folder)
+
+        for folder in [scanner_folder, scan_folder]:
+            shutil.rmtree(folder, ignore_errors=True)
+            os.makedirs(folder)
+
+        if arguments.transport == "git-daemon":
+            daemon, endpoint = start_git_daemon(
+                repositories_folder, f"{ORGANIZATION}/{names[0]}"
+            )
+        else:
+            endpoint = f"file://{repositories_folder}/{{organization}}/{{repository}}"
+
+        duration, peak_rss, results = run_scanner(
+            arguments, scanner_folder, scan_folder, endpoint, names
+        )
+        report = {
+            "parameters": {
+                **{
+                    key: value
+                    for key, value in vars(arguments).items()
+                    if key not in ["work_folder", "output"]
+                },
+            },
+            "repositories": len(results["results"]),
+            "failures": sum(1 for r in results["results"] if r["status"] != "success"),
+            "findings": sum(len(r["findings"]) for r in results["results"]),
+            "duration": duration,
+            "repositories_per_minute": len(results["results"]) / duration * 60,
+            "peak_rss": peak_rss,
+            "phases": get_phase_timings(
+                os.path.join(scanner_folder, "logs", "secrets-finder.log")
+            ),
+        }
+        print_report(report)
+
+        if arguments.output:
+            with open(arguments.output, "w") as file:
+                json.dump(report, file, indent=2)
+    finally:
+        if daemon:
+            daemon.terminate()
+            daemon.wait()
+        if not arguments.work_folder:
+            shutil.rmtree(work_folder, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Stand-in for the TruffleHog binary, used to benchmark the scanner without depending on detectors
+or on network access for verification.
+
+It accepts the arguments passed by the scanner to TruffleHog ('git' and 'filesystem' commands) and
+reports as a finding every line matching SECRET_PATTERN, in TruffleHog's JSON output format. Its
+behaviour is controlled with environment variables:
+
+- FAKE_TRUFFLEHOG_STARTUP_LATENCY: seconds to wait before scanning (default: 0)
+- FAKE_TRUFFLEHOG_COMMIT_LATENCY: seconds to wait per commit scanned (default: 0)
+- FAKE_TRUFFLEHOG_VERIFICATION_LATENCY: seconds to wait per secret verified (default: 0)
+- FAKE_TRUFFLEHOG_OUTPUT_MULTIPLIER: number of times each finding is reported (default: 1)
+- FAKE_TRUFFLEHOG_LOG_LINES: number of log lines written to stderr per commit (default: 0)
+- FAKE_TRUFFLEHOG_VERIFIED_RATIO: share of secrets reported as verified (default: 0)
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+
+
+SECRET_PATTERN = re.compile(r"AKIA[0-9A-Z]{16}")
+
+
+def get_float(name, default=0):
+    return float(os.environ.get(name, default))
+
+
+def is_verified(secret, verify):
+    if not verify:
+        return False
+    time.sleep(get_float("FAKE_TRUFFLEHOG_VERIFICATION_LATENCY"))
+    digest = int(hashlib.sha256(secret.encode()).hexdigest()[:8], 16)
+    return digest / 0xFFFFFFFF < get_float("FAKE_TRUFFLEHOG_VERIFIED_RATIO")
+
+
+def get_finding(secret, source_name, source_type, metadata_type, metadata, verify):
+    return {
+        "SourceMetadata": {"Data": {metadata_type: metadata}},
+        "SourceID": 1,
+        "SourceType": source_type,
+        "SourceName": source_name,
+        "DetectorType": 2,
+        "DetectorName": "AWS",
+        "DecoderName": "PLAIN",
+        "Verified": is_verified(secret, verify),
+        "Raw": secret,
+        "RawV2": "",
+        "Redacted": secret,
+        "ExtraData": {"resource_type": "Access key"},
+        "StructuredData": None,
+    }
+
+
+def report(finding, only_verified):
+    if only_verified and not finding["Verified"]:
+        return
+    line = json.dumps(finding)
+    for _ in range(int(get_float("FAKE_TRUFFLEHOG_OUTPUT_MULTIPLIER", 1))):
+        print(line)
+
+
+def scan_git(arguments, verify):
+    repository = arguments.uri[len("file://") :]
+    command = [
+        "git",
+        "-C",
+        repository,
+        "log",
+        "-p",
+        "--unified=0",
+        "--no-color",
+        "--format=commit %H%x00%ae%x00%ad",
+        "--date=format:%Y-%m-%d %H:%M:%S +0000",
+    ]
+    if arguments.max_depth:
+        command.append(f"--max-count={arguments.max_depth}")
+    if arguments.branch:
+        command.append(arguments.branch)
+    else:
+        command.append("--all")
+    if arguments.since_commit:
+        command.append(f"^{arguments.since_commit}")
+
+    commit_latency = get_float("FAKE_TRUFFLEHOG_COMMIT_LATENCY")
+    log_lines = int(get_float("FAKE_TRUFFLEHOG_LOG_LINES"))
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+
+    commit, email, timestamp, file, line_number = None, None, None, None, 0
+    for line in process.stdout:
+        if line.startswith("commit "):
+            commit, email, timestamp = line[len("commit ") :].rstrip("\n").split("\0")
+            time.sleep(commit_latency)
+            for index in range(log_lines):
+                print(f"scanning commit {commit} ({index})", file=sys.stderr)
+        elif line.startswith("+++ "):
+            file = line[len("+++ b/") :].rstrip("\n")
+        elif line.startswith("@@ "):
+            line_number = int(line.split("+")[1].split(",")[0].split(" ")[0]) - 1
+        elif line.startswith("+"):
+            line_number += 1
+            for secret in SECRET_PATTERN.findall(line):
+                metadata = {
+                    "commit": commit,
+                    "file": file,
+                    "email": email,
+                    "repository": arguments.uri,
+                    "timestamp": timestamp,
+                    "line": line_number,
+                }
+                report(
+                    get_finding(
+                        secret, "trufflehog - git", 16, "Git", metadata, verify
+                    ),
+                    arguments.only_verified,
+                )
+
+    process.wait()
+
+
+def scan_filesystem(arguments, verify):
+    for root, _, files in os.walk(arguments.uri):
+        for name in sorted(files):
+            path = os.path.join(root, name)
+            with open(path, "r", errors="ignore") as file:
+                for line_number, line in enumerate(file, start=1):
+                    for secret in SECRET_PATTERN.findall(line):
+                        metadata = {"file": path, "line": line_number}
+                        report(
+                            get_finding(
+                                secret,
+                                "trufflehog - filesystem",
+                                15,
+                                "Filesystem",
+                                metadata,
+                                verify,
+                            ),
+                            arguments.only_verified,
+                        )
+
+
+def main():
+    parser = argparse.ArgumentParser(prog="fake-trufflehog")
+    parser.add_argument("command", choices=["git", "filesystem"])
+    parser.add_argument("uri")
+    parser.add_argument("--no-update", action="store_true")
+    parser.add_argument("--json", action="store_true")
+    parser.add_argument("--only-verified", action="store_true")
+    parser.add_argument("--no-verification", action="store_true")
+    parser.add_argument("--since-commit")
+    parser.add_argument("--branch")
+    parser.add_argument("--max-depth", type=int)
+    parser.add_argument("--config")
+    parser.add_argument("--include-detectors")
+    arguments = parser.parse_args()
+
+    time.sleep(get_float("FAKE_TRUFFLEHOG_STARTUP_LATENCY"))
+    verify = not arguments.no_verification
+    if arguments.command == "git":
+        scan_git(arguments, verify)
+    else:
+        scan_filesystem(arguments, verify)
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,7 @@ import json
 import time
 import sys
 import logging
+import os
 from pathlib import Path
 from github_inventory.config import settings
 from dynaconf.validator import ValidationError
@@ -87,7 +88,110 @@ def run_query(session, query, variables=None, retry_count=5):
     return json_response
 
 
-def get_repository_details(session, repository, query):
+class QueryFailedError(Exception):
+    """Raised when a GraphQL query still fails after all retries were exhausted."""
+
+    pass
+
+
+def execute_query(session, query, variables=None):
+    result = run_query(session, query, variables)
+    if result is None:
+        raise QueryFailedError(f"Query failed with variables: {variables}")
+    return result
+
+
+class Checkpoint:
+    """
+    Append-only journal recording the progress of an inventory crawl.
+
+    Every organization page, repository details page and emitted repository is
+    written as one JSON line, so an interrupted crawl can be replayed and resumed
+    from the last cursor without repeating the queries already performed.
+    """
+
+    def __init__(self, path, resume=False):
+        self.path = path
+        self.organization_cursor = ""
+        self.repositories = []
+        self.emitted = set()
+        self.pending = {}
+
+        if resume and os.path.isfile(path):
+            valid_length = self._replay()
+            # Drop a truncated last line, so that new entries are not appended to it
+            with open(path, "r+b") as f:
+                f.truncate(valid_length)
+            logging.info(
+                f"Resuming inventory from checkpoint {path}: {len(self.repositories)} repositories already fetched."
+            )
+        self.file = open(path, "a" if resume else "w")
+
+    def _replay(self):
+        """
+        Replays the entries of the checkpoint file, and returns the length in bytes of the
+        entries read successfully.
+        """
+        valid_length = 0
+        with open(self.path, "rb") as f:
+            for line in f:
+                # The last line may be truncated if the process was killed while writing it
+                if not line.endswith(b"\n"):
+                    break
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    break
+                valid_length += len(line)
+                if entry["type"] == "organization":
+                    self.organization_cursor = entry["cursor"]
+                elif entry["type"] == "details":
+                    self.pending[entry["repository"]["name"]] = entry["repository"]
+                elif entry["type"] in ("pullRequests", "issues"):
+                    apply_connection_page(
+                        self.pending[entry["name"]][entry["type"]], entry["page"]
+                    )
+                elif entry["type"] == "repository":
+                    self._emit(entry["repository"])
+        return valid_length
+
+    def _append(self, entry):
+        self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+        self.file.flush()
+
+    def _emit(self, repository):
+        self.repositories.append(repository)
+        self.emitted.add(repository["name"])
+        self.pending.pop(repository["name"], None)
+
+    def save_organization_cursor(self, cursor):
+        self.organization_cursor = cursor
+        self._append({"type": "organization", "cursor": cursor})
+
+    def save_details(self, repository):
+        self.pending[repository["name"]] = repository
+        self._append({"type": "details", "repository": repository})
+
+    def save_connection_page(self, name, connection, page):
+        apply_connection_page(self.pending[name][connection], page)
+        self._append({"type": connection, "name": name, "page": page})
+
+    def save_repository(self, repository):
+        self._emit(repository)
+        self._append({"type": "repository", "repository": repository})
+
+    def close(self, remove=False):
+        self.file.close()
+        if remove:
+            os.remove(self.path)
+
+
+def apply_connection_page(connection, page):
+    connection["nodes"].extend(page["nodes"])
+    connection["pageInfo"] = page["pageInfo"]
+
+
+def get_repository_details(session, repository, query, checkpoint):
     filter_pr, filter_issues = settings.pr_labels, settings.issues_labels
     # Let's first to try to fetch the repository with 100 pull requests and 100 issues, if there are more we'll handle pagination
     repository_variables = {
@@ -100,7 +204,13 @@ def get_repository_details(session, repository, query):
         "pullRequestsLabel": filter_pr,
         "issuesLabel": filter_issues,
     }
-    repository = run_query(session, query, repository_variables)["data"]["repository"]
+    if repository["name"] in checkpoint.pending:
+        repository = checkpoint.pending[repository["name"]]
+    else:
+        repository = execute_query(session, query, repository_variables)["data"][
+            "repository"
+        ]
+        checkpoint.save_details(repository)
 
     pr_page_info = (
         repository["pullRequests"]["pageInfo"]
@@ -120,11 +230,13 @@ def get_repository_details(session, repository, query):
             }
         )
 
-        pr_result = run_query(session, query, pr_variables)
-        repository["pullRequests"]["nodes"].extend(
-            pr_result["data"]["repository"]["pullRequests"]["nodes"]
+        pr_result = execute_query(session, query, pr_variables)
+        checkpoint.save_connection_page(
+            repository["name"],
+            "pullRequests",
+            pr_result["data"]["repository"]["pullRequests"],
         )
-        pr_page_info = pr_result["data"]["repository"]["pullRequests"]["pageInfo"]
+        pr_page_info = repository["pullRequests"]["pageInfo"]
 
     # Handle pagination for issues
     issue_page_info = (
@@ -142,42 +254,52 @@ def get_repository_details(session, repository, query):
                 "issuesLabel": filter_issues,
             }
         )
-        issue_result = run_query(session, query, issues_variables)
-        repository["issues"]["nodes"].extend(
-            issue_result["data"]["repository"]["issues"]["nodes"]
+        issue_result = execute_query(session, query, issues_variables)
+        checkpoint.save_connection_page(
+            repository["name"], "issues", issue_result["data"]["repository"]["issues"]
         )
-        issue_page_info = issue_result["data"]["repository"]["issues"]["pageInfo"]
+        issue_page_info = repository["issues"]["pageInfo"]
     yield repository
 
 
-def get_repositories(session, queries):
-    org_cursor = ""
+def get_repositories(session, queries, checkpoint):
+    org_cursor = checkpoint.organization_cursor
     totalCount = None
     organization_variables = {"org": settings.org, "organizationCursor": org_cursor}
     while True:
         organization_variables.update({"organizationCursor": org_cursor})
-        result = run_query(session, queries["org"], organization_variables)
+        checkpoint.save_organization_cursor(org_cursor)
+        result = execute_query(session, queries["org"], organization_variables)
         if not totalCount:
             totalCount = {
                 "initialCount": result["data"]["organization"]["repositories"][
                     "totalCount"
                 ],
-                "currentCount": 0,
+                "currentCount": len(checkpoint.repositories),
             }
 
         totalCount["currentCount"] += len(
-            result["data"]["organization"]["repositories"]["nodes"]
+            [
+                repository
+                for repository in result["data"]["organization"]["repositories"][
+                    "nodes"
+                ]
+                if repository["name"] not in checkpoint.emitted
+            ]
         )
 
         logging.info(
             f"Progress: {totalCount['currentCount']} / {totalCount['initialCount']} - Total repositories left to fetch: {totalCount['initialCount'] - totalCount['currentCount']}."
         )
         for repository in result["data"]["organization"]["repositories"]["nodes"]:
+            if repository["name"] in checkpoint.emitted:
+                continue
             if settings.pr or settings.issues:
                 yield from get_repository_details(
                     session,
                     repository,
                     queries["repository"],
+                    checkpoint,
                 )
             else:
                 yield repository
@@ -260,6 +382,17 @@ def main(argv=None):
             ),
             help="Path to custom GraphQL query for fetching repository details",
         )
+        parser.add_argument(
+            "--resume",
+            default=settings.get("resume"),
+            action="store_true",
+            help="Resume an interrupted inventory from its checkpoint file",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            default=settings.get("checkpoint"),
+            help="Path to the checkpoint file (default: inventory-<org>.checkpoint.jsonl)",
+        )
     except argparse.ArgumentError as e:
         logging.error(f"Error occurred while parsing arguments: {e}")
         sys.exit(1)
@@ -293,14 +426,25 @@ def main(argv=None):
     }
     session.headers.update(headers)
 
-    inventory = []
-    for repo in get_repositories(session, queries):
-        repo = clean_up(repo)
-        inventory.append(repo)
+    checkpoint = Checkpoint(
+        settings.checkpoint or f"inventory-{organization_name}.checkpoint.jsonl",
+        resume=settings.resume,
+    )
+    try:
+        for repo in get_repositories(session, queries, checkpoint):
+            checkpoint.save_repository(clean_up(repo))
+    except (QueryFailedError, KeyboardInterrupt) as e:
+        checkpoint.close()
+        session.close()
+        logging.error(
+            f"Inventory interrupted: {e}. Progress saved to {checkpoint.path}, run again with --resume to continue."
+        )
+        sys.exit(1)
 
     session.close()
     with open(f"inventory-{organization_name}.json", "w") as f:
-        json.dump(inventory, f, indent=4)
+        json.dump(checkpoint.repositories, f, indent=4)
+    checkpoint.close(remove=True)
     logging.info(f"Inventory saved to inventory-{organization_name}.json")
 
 
@@ -1,18 +1,25 @@
 import argparse
+import concurrent.futures
 import datetime
 import dotenv
 import glob
+import hashlib
 import json
 import logging
 import logging.config
 import os
 import requests
+import requests.adapters
 import requests.exceptions
 import sys
+import threading
 import urllib.parse
 from time import sleep, time
 
 
+# Fields of the repository objects returned by the API that are needed to plan a scan
+DEFAULT_REPOSITORY_FIELDS = "name,size,pushed_at,default_branch,archived,fork"
+
 LOG_FUNCTIONS = {
     "INFO": logging.info,
     "WARNING": logging.warning,
@@ -45,6 +52,13 @@ def non_empty_string(value):
     return svalue
 
 
+def comma_separated_list(value):
+    values = [item.strip() for item in str(value).split(",") if item.strip()]
+    if not values:
+        raise argparse.ArgumentTypeError("value must contain at least one element")
+    return values
+
+
 # This validation is used to reject common malformed URLs. It does not aim to strictly validate URLs.
 # More information: https://docs.python.org/3/library/urllib.parse.html#url-parsing-security
 def valid_uri(value):
@@ -86,13 +100,39 @@ def configure_parser():
             "https://github.com/{organization}/{repository}",
         ),
     )
-    parser.add_argument(
+    organizations = parser.add_mutually_exclusive_group(
+        required=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ORGANIZATION") is None
+        and os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ORGANIZATIONS") is None
+        and os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ALL_ORGANIZATIONS") is None
+    )
+    organizations.add_argument(
         "--organization",
         help="GitHub organization for which repositories should be fetched",
         type=non_empty_string,
-        required=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ORGANIZATION") is None,
         default=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ORGANIZATION"),
     )
+    organizations.add_argument(
+        "--organizations",
+        help="comma-separated list of GitHub organizations to process in batch mode",
+        type=comma_separated_list,
+        default=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_ORGANIZATIONS"),
+    )
+    organizations.add_argument(
+        "--all-organizations",
+        help="process in batch mode all the organizations returned by the /organizations endpoint (intended for GitHub Enterprise Server)",
+        action="store_true",
+        default=os.environ.get(
+            "GITHUB_ORGANIZATION_PROCESSOR_ALL_ORGANIZATIONS", False
+        ),
+    )
+    parser.add_argument(
+        "--output-mode",
+        help="in batch mode, whether to write the scan configuration per organization or to merge it in one file",
+        choices=["per-organization", "merged"],
+        default=os.environ.get(
+            "GITHUB_ORGANIZATION_PROCESSOR_OUTPUT_MODE", "per-organization"
+        ),
+    )
     parser.add_argument(
         "--max-retries",
         help="maximum number of retries for rate limiting",
@@ -105,6 +145,26 @@ def configure_parser():
         type=positive_int,
         default=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_BACKOFF_FACTOR", 1),
     )
+    parser.add_argument(
+        "--fields",
+        help="comma-separated list of repository fields to keep ('*' to keep all fields)",
+        type=comma_separated_list,
+        default=os.environ.get(
+            "GITHUB_ORGANIZATION_PROCESSOR_FIELDS", DEFAULT_REPOSITORY_FIELDS
+        ),
+    )
+    parser.add_argument(
+        "--concurrency",
+        help="maximum number of concurrent requests sent to the API",
+        type=positive_int,
+        default=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_CONCURRENCY", 8),
+    )
+    parser.add_argument(
+        "--cache-folder",
+        help="folder where responses are cached to send conditional requests (disabled if not set)",
+        type=non_empty_string,
+        default=os.environ.get("GITHUB_ORGANIZATION_PROCESSOR_CACHE_FOLDER"),
+    )
 
     return parser
 
@@ -134,8 +194,74 @@ class MaxRetriesExceededError(Exception):
     pass
 
 
+class HTTPCache:
+    """On-disk cache of GET responses, used to send conditional requests (ETag / Last-Modified)."""
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, url):
+        return os.path.join(
+            self.folder, f"{hashlib.sha256(url.encode('utf-8')).hexdigest()}.json"
+        )
+
+    def get(self, url):
+        try:
+            with open(self._path(url), "r") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def conditional_headers(self, url):
+        entry = self.get(url)
+        if not entry:
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url, response):
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if not etag and not last_modified:
+            return
+
+        entry = {
+            "etag": etag,
+            "last_modified": last_modified,
+            "link": response.headers.get("Link"),
+            "body": response.text,
+        }
+        temporary_path = f"{self._path(url)}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(entry, file, separators=(",", ":"))
+        os.replace(temporary_path, self._path(url))
+
+    def restore(self, url, response):
+        entry = self.get(url)
+        response._content = entry["body"].encode("utf-8")
+        response.encoding = "utf-8"
+        if entry.get("link") and "Link" not in response.headers:
+            response.headers["Link"] = entry["link"]
+        return response
+
+
 class GitHubClient:
-    def __init__(self, api, token, max_retries=10, backoff_factor=1):
+    def __init__(
+        self,
+        api,
+        token,
+        max_retries=10,
+        backoff_factor=1,
+        cache=None,
+        concurrency=8,
+        fields=None,
+    ):
         log("INFO", "GITHUB-ORGANIZATION-PROCESSOR", "Configuring GitHub client...")
 
         self.api = api
@@ -147,6 +273,24 @@ class GitHubClient:
         }
         self.max_retries = max_retries
         self.backoff_factor = backoff_factor
+        self.cache = cache
+        self.concurrency = int(concurrency)
+        # The name is always kept as it is required to build the list of repositories to scan
+        self.fields = (
+            None
+            if not fields or "*" in fields
+            else ["name"] + [field for field in fields if field != "name"]
+        )
+        self.rate_limit_reset = 0
+        self.rate_limit_lock = threading.Lock()
+
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = requests.adapters.HTTPAdapter(
+            pool_connections=1, pool_maxsize=self.concurrency, pool_block=True
+        )
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
 
         log(
             "INFO",
@@ -169,13 +313,23 @@ class GitHubClient:
         max_retries = self.max_retries
         backoff_factor = self.backoff_factor
         rate_limit_retry_count = 0
+        use_cache = self.cache is not None and method == "GET"
 
         while True:
             try:
+                self._wait_for_rate_limit_reset()
                 log("DEBUG", "GITHUB-CLIENT", f"{method} request to {url}")
-                response = requests.request(method, url, headers=self.headers, **kwargs)
+                headers = self.cache.conditional_headers(url) if use_cache else None
+                response = self.session.request(method, url, headers=headers, **kwargs)
 
-                if 200 <= response.status_code < 300:
+                if use_cache and response.status_code == 304:
+                    log(
+                        "DEBUG",
+                        "GITHUB-CLIENT",
+                        f"Resource not modified, serving cached response for {url}",
+                    )
+                    return self.cache.restore(url, response)
+                elif 200 <= response.status_code < 300:
                     log(
                         "DEBUG",
                         "GITHUB-CLIENT",
@@ -186,6 +340,8 @@ class GitHubClient:
                         "GITHUB-CLIENT",
                         f"Response returned by {url}: {response.json()}",
                     )
+                    if use_cache:
+                        self.cache.store(url, response)
                     return response
                 elif (
                     response.status_code == 403
@@ -202,6 +358,11 @@ class GitHubClient:
                     if reset_timestamp <= current_timestamp:
                         continue
 
+                    with self.rate_limit_lock:
+                        self.rate_limit_reset = max(
+                            self.rate_limit_reset, reset_timestamp
+                        )
+
                     sleep_time = reset_timestamp - current_timestamp + 1
                     log(
                         "WARNING",
@@ -240,17 +401,75 @@ class GitHubClient:
                     "DEBUG",
                     "GITHUB-CLIENT",
                     f"An error occurred while executing a {method} request to {url}: {e}",
-                    custom_color="red",
                 )
                 raise e
 
-    def get_repositories(self, organization):
-        url = f"{self.api}/orgs/{organization}/repos"
-        repositories = []
+    def _wait_for_rate_limit_reset(self):
+        # The rate limit is shared by all the threads using this client: once one of them
+        # hits it, the others wait for the reset instead of spending requests on 403 responses.
+        sleep_time = self.rate_limit_reset - int(time()) + 1
+        if sleep_time > 0:
+            log(
+                "DEBUG",
+                "GITHUB-CLIENT",
+                f"Waiting {sleep_time} seconds for rate limit reset.",
+            )
+            sleep(sleep_time)
+
+    def get_organizations(self):
+        url = f"{self.api}/organizations?per_page=100"
+        organizations = []
         while url:
             response = self.make_api_request(method="GET", url=url)
-            repositories.extend(response.json())
+            organizations.extend(
+                organization.get("login") for organization in response.json()
+            )
+            url = response.links.get("next", {}).get("url")
+
+        log(
+            "DEBUG",
+            "GITHUB-CLIENT",
+            f"Number of organizations found: {len(organizations)}",
+        )
+        return organizations
+
+    def get_repositories(self, organization):
+        url = f"{self.api}/orgs/{organization}/repos?per_page=100"
+        response = self.make_api_request(method="GET", url=url)
+        repositories = self._project(response.json())
+
+        last_url = response.links.get("last", {}).get("url")
+        if last_url:
+            page_urls = self._get_page_urls(last_url)
+            rate_limit_remaining = response.headers.get("X-RateLimit-Remaining")
+            workers = self.concurrency
+            if rate_limit_remaining and int(rate_limit_remaining) < len(page_urls):
+                log(
+                    "WARNING",
+                    "GITHUB-CLIENT",
+                    f"Remaining rate limit ({rate_limit_remaining}) is lower than the number of pages to fetch ({len(page_urls)}). Fetching pages sequentially.",
+                )
+                workers = 1
+
+            log(
+                "DEBUG",
+                "GITHUB-CLIENT",
+                f"Fetching {len(page_urls)} remaining page(s) for organization {organization} with {workers} worker(s)",
+            )
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                for page in executor.map(
+                    lambda page_url: self._project(
+                        self.make_api_request(method="GET", url=page_url).json()
+                    ),
+                    page_urls,
+                ):
+                    repositories.extend(page)
+        else:
             url = response.links.get("next", {}).get("url")
+            while url:
+                response = self.make_api_request(method="GET", url=url)
+                repositories.extend(self._project(response.json()))
+                url = response.links.get("next", {}).get("url")
 
         log(
             "DEBUG",
@@ -259,6 +478,33 @@ class GitHubClient:
         )
         return repositories
 
+    def _project(self, repositories):
+        # Projection is applied page by page so the full repository objects are never kept in memory
+        if self.fields is None:
+            return repositories
+        return [
+            {field: repository.get(field) for field in self.fields}
+            for repository in repositories
+        ]
+
+    def _get_page_urls(self, last_url):
+        parsed_url = urllib.parse.urlparse(last_url)
+        query = urllib.parse.parse_qs(parsed_url.query)
+        last_page = int(query["page"][0])
+
+        page_urls = []
+        for page in range(2, last_page + 1):
+            query["page"] = [str(page)]
+            page_urls.append(
+                parsed_url._replace(
+                    query=urllib.parse.urlencode(query, doseq=True)
+                ).geturl()
+            )
+        return page_urls
+
+    def close(self):
+        self.session.close()
+
 
 def persist_repositories_information(
     organization,
@@ -278,7 +524,7 @@ def persist_repositories_information(
     }
 
     with open(f"{location}/{filename}", "w") as file:
-        json.dump(formatted_list_of_repositories, file, indent=4)
+        json.dump(formatted_list_of_repositories, file, separators=(",", ":"))
 
     log(
         "INFO",
@@ -321,6 +567,112 @@ def persist_repositories_for_scan(
     )
 
 
+def persist_merged_repositories_for_scan(
+    repositories_by_organization,
+    clone_url_template,
+    location=os.environ.get("SECRETS_FINDER_SCAN_FOLDER", "."),
+    filename="repositories_to_scan.json",
+):
+    log(
+        "INFO",
+        "GITHUB-ORGANIZATION-PROCESSOR",
+        f"Persisting merged list of repositories for {len(repositories_by_organization)} organization(s) to: {location}/{filename}",
+    )
+
+    formatted_list_of_repositories = {
+        "scm": "github",
+        "endpoint": clone_url_template,
+        "repositories": [],
+    }
+
+    for organization, repositories in repositories_by_organization.items():
+        for repository in repositories:
+            formatted_list_of_repositories.get("repositories").append(
+                {"organization": organization, "name": repository.get("name")}
+            )
+
+    with open(f"{location}/{filename}", "w") as file:
+        json.dump(formatted_list_of_repositories, file, indent=4)
+
+    log(
+        "INFO",
+        "GITHUB-ORGANIZATION-PROCESSOR",
+        f"Merged list of repositories persisted successfully to: {location}/{filename}",
+    )
+
+
+def process_organization(github_client, organization, clone_url_template, location):
+    repositories = github_client.get_repositories(organization=organization)
+    persist_repositories_information(
+        organization=organization, repositories=repositories, location=location
+    )
+    if clone_url_template:
+        persist_repositories_for_scan(
+            organization=organization,
+            repositories=repositories,
+            clone_url_template=clone_url_template,
+            location=location,
+        )
+    return repositories
+
+
+def process_organizations(
+    github_client, organizations, clone_url_template, output_mode, location
+):
+    log(
+        "INFO",
+        "GITHUB-ORGANIZATION-PROCESSOR",
+        f"Processing {len(organizations)} organization(s) in batch mode with {github_client.concurrency} worker(s)...",
+    )
+
+    def process(organization):
+        organization_location = os.path.join(location, organization)
+        os.makedirs(organization_location, exist_ok=True)
+        return process_organization(
+            github_client,
+            organization,
+            clone_url_template if output_mode == "per-organization" else None,
+            organization_location,
+        )
+
+    repositories_by_organization = {}
+    failed_organizations = []
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=github_client.concurrency
+    ) as executor:
+        futures = {
+            executor.submit(process, organization): organization
+            for organization in organizations
+        }
+        for future in concurrent.futures.as_completed(futures):
+            organization = futures[future]
+            try:
+                repositories_by_organization[organization] = future.result()
+            except Exception as exception:
+                failed_organizations.append(organization)
+                log(
+                    "ERROR",
+                    "GITHUB-ORGANIZATION-PROCESSOR",
+                    f"An error occurred while processing organization {organization}: {str(exception)}",
+                )
+
+    if output_mode == "merged":
+        persist_merged_repositories_for_scan(
+            repositories_by_organization={
+                organization: repositories_by_organization[organization]
+                for organization in organizations
+                if organization in repositories_by_organization
+            },
+            clone_url_template=clone_url_template,
+            location=location,
+        )
+
+    if failed_organizations:
+        raise Exception(
+            f"Processing failed for {len(failed_organizations)} organization(s): {', '.join(sorted(failed_organizations))}"
+        )
+
+
 def main():
     try:
         load_environment_variables()
@@ -351,18 +703,34 @@ def main():
             ),
             max_retries=arguments.max_retries,
             backoff_factor=arguments.backoff_factor,
+            cache=HTTPCache(arguments.cache_folder) if arguments.cache_folder else None,
+            concurrency=arguments.concurrency,
+            fields=arguments.fields,
         )
-        repositories = github_client.get_repositories(
-            organization=arguments.organization
-        )
-        persist_repositories_information(
-            organization=arguments.organization, repositories=repositories
-        )
-        persist_repositories_for_scan(
-            organization=arguments.organization,
-            repositories=repositories,
-            api=arguments.clone_url_template,
-        )
+        location = os.environ.get("SECRETS_FINDER_SCAN_FOLDER", ".")
+
+        try:
+            if arguments.organizations or arguments.all_organizations:
+                process_organizations(
+                    github_client=github_client,
+                    organizations=(
+                        arguments.organizations
+                        if arguments.organizations
+                        else github_client.get_organizations()
+                    ),
+                    clone_url_template=arguments.clone_url_template,
+                    output_mode=arguments.output_mode,
+                    location=location,
+                )
+            else:
+                process_organization(
+                    github_client=github_client,
+                    organization=arguments.organization,
+                    clone_url_template=arguments.clone_url_template,
+                    location=location,
+                )
+        finally:
+            github_client.close()
 
         sys.exit(0)
     except Exception as exception: